@@ -0,0 +1,141 @@
+# bsky_profiles.py
+"""
+Avatars Bluesky résolus par lots, avec cache persistant.
+- app.bsky.actor.getProfiles : jusqu'à 25 comptes par requête (au lieu d'un getProfile par post)
+- cache SQLite sur disque (handle ou DID -> avatar) valable PROFILE_TTL : un avatar est
+  redemandé au plus une fois par jour, un compte inconnu aussi
+- prefetch(actors) : résout d'un coup tous les auteurs d'un flux ou de la file d'enrichissement ;
+  les appels suivants (avatar()) sont servis par le cache
+Partagé entre threads et entre processus (SQLite WAL).
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+import http_client
+
+# ---- paramètres ----
+BSKY_PROFILES_ENDPOINT = "https://public.api.bsky.app/xrpc/app.bsky.actor.getProfiles"
+BATCH_SIZE = 25                 # maximum accepté par getProfiles
+PROFILE_TTL = 24 * 3600         # un avatar change au plus une fois par jour
+CACHE_PATH = Path(os.getenv(
+    "BSKY_PROFILE_CACHE_PATH", str(Path.home() / ".cache" / "agregateur_profiles" / "bsky.sqlite")
+))
+
+
+class ProfileCache:
+    """Table authors : actor (handle en minuscules ou DID) -> avatar (None = compte sans avatar / inconnu)."""
+
+    def __init__(self, path: Path = CACHE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS authors (
+                actor TEXT PRIMARY KEY,
+                avatar TEXT,
+                fetched_at REAL NOT NULL
+            )""")
+        self._db.commit()
+
+    def lookup(self, actors) -> dict:
+        """{actor: avatar} pour les comptes connus et encore frais (les autres sont absents)."""
+        actors = list(actors)
+        out = {}
+        with self._lock:
+            for i in range(0, len(actors), 500):
+                chunk = actors[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT actor, avatar FROM authors WHERE fetched_at > ? AND actor IN ({','.join('?' * len(chunk))})",
+                    (time.time() - PROFILE_TTL, *chunk),
+                ).fetchall()
+                out.update(rows)
+        return out
+
+    def store(self, avatars: dict):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO authors (actor, avatar, fetched_at) VALUES (?, ?, ?)",
+                [(actor, avatar, now) for actor, avatar in avatars.items()],
+            )
+            self._db.execute("DELETE FROM authors WHERE fetched_at <= ?", (now - 7 * PROFILE_TTL,))
+            self._db.commit()
+
+
+_CACHE: ProfileCache | None = None
+_MEMO: dict[str, str | None] = {}      # déjà résolus pendant ce run
+# une seule résolution à la fois : deux threads qui demandent le même auteur ne font qu'une requête
+_FETCH_LOCK = threading.Lock()
+
+
+def get_cache() -> ProfileCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ProfileCache()
+    return _CACHE
+
+
+def normalize_actor(value: str | None) -> str | None:
+    """'@Alice.bsky.social' -> 'alice.bsky.social' ; les DID sont gardés tels quels."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip().lstrip("@")
+    return value if value.startswith("did:") else value.lower()
+
+
+def _fetch_batch(actors: list) -> dict | None:
+    """Un appel getProfiles ; None si l'API n'a pas répondu (rien n'est mis en cache)."""
+    try:
+        resp = http_client.get(BSKY_PROFILES_ENDPOINT, params={"actors": actors}, cache=False)
+    except requests.RequestException as e:
+        print(f"[Bluesky] Error: {e}")
+        return None
+    if not resp.ok:
+        print(f"[Bluesky] HTTP {resp.status_code} for {len(actors)} profils")
+        return None
+    try:
+        payload = resp.json() or {}
+    except ValueError:
+        print(f"[Bluesky] Réponse illisible pour {len(actors)} profils")
+        return None
+    found = {}
+    for profile in payload.get("profiles") or []:
+        for key in (profile.get("did"), profile.get("handle")):
+            if normalize_actor(key):
+                found[normalize_actor(key)] = profile.get("avatar")
+    # comptes absents de la réponse (supprimés, suspendus...) : mis en cache comme "sans avatar"
+    return {actor: found.get(actor) for actor in actors} | found
+
+
+def prefetch(actors):
+    """Résout les avatars de `actors` encore inconnus, par lots de BATCH_SIZE."""
+    wanted = {a for a in map(normalize_actor, actors) if a}
+    with _FETCH_LOCK:
+        missing = wanted - _MEMO.keys()
+        if not missing:
+            return
+        cached = get_cache().lookup(missing)
+        _MEMO.update(cached)
+        missing = sorted(missing - cached.keys())
+        for i in range(0, len(missing), BATCH_SIZE):
+            avatars = _fetch_batch(missing[i:i + BATCH_SIZE])
+            if avatars:
+                get_cache().store(avatars)
+                _MEMO.update(avatars)
+
+
+def avatar(actor: str | None) -> str | None:
+    """Avatar d'un compte (handle ou DID), None si inconnu ou si l'API n'a pas répondu."""
+    actor = normalize_actor(actor)
+    if not actor:
+        return None
+    if actor not in _MEMO:
+        prefetch([actor])
+    return _MEMO.get(actor)
@@ -0,0 +1,332 @@
+# enrichment_queue.py
+"""
+File d'attente persistante des enrichissements (table enrichment_jobs de mydb.db).
+L'ingestion insère tout de suite le contenu construit à partir du flux, puis met en file
+ce qui demande du réseau :
+- "page"          : date / description / image / titre depuis la page de l'article
+- "profile_image" : avatar Bluesky (résolus par lots, voir bsky_profiles.py) / Mastodon / X
+- "logo"          : logo de l'institution (Google CSE)
+- "placeholder"   : dimensions, couleur dominante et aperçu flou de l'image (voir thumbnails.py) ;
+                    mise en file à l'ingestion, ou quand la tâche "page" trouve l'image
+Les tâches sont traitées par un pool de threads (réseau) ; les écritures en base restent
+faites par le thread qui vide la file. Échec réseau → nouvelle tentative avec backoff
+exponentiel, jusqu'à MAX_ATTEMPTS. Les tâches non traitées restent en file pour le run suivant.
+Budget : chaque type de tâche peut recevoir une échéance (les logos renoncent avant les avatars,
+eux-mêmes avant les pages), et chaque tâche "page" un délai maximal.
+Logos : le quota Google CSE est limité ; les sites qui concernent le plus de contenus sont résolus
+d'abord, les tâches restantes sont reportées à la remise à zéro du quota (sans compter d'échec).
+"""
+import json
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import feedparser
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import bsky_profiles
+import thumbnails
+from parser_profile_image_test import bluesky_actor
+from parser_logo_image_test import CseQuotaExhausted, cached_logo_institution, cse_quota_resets_at, logo_prefix
+from aggcon_v2 import (
+    HTML_TAG_RE, HTTP_HEADERS, UPSERT_CHUNK, Content, EnrichmentJob, PageContext, SessionLocal,
+    best_description_for_entry, choose_title, extract_entry_published, extract_image_from_entry,
+    institution_logo, profile_image, scan_pertinence,
+)
+
+# ---- paramètres ----
+TASK_PRIORITY = {"page": 10, "profile_image": 5, "placeholder": 3, "logo": 1}   # le plus visible d'abord
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 300          # s : 5 min, 10, 20, 40...
+BACKOFF_MAX = 12 * 3600
+LEASE = timedelta(minutes=15)      # une tâche "running" plus vieille est reprise (process tué)
+FAILED_RETENTION = timedelta(days=30)
+ENRICH_WORKERS = 8
+
+
+# ---- (dé)sérialisation des entrées feedparser ----
+
+def _jsonable(value):
+    # struct_time est un tuple : à marquer avant que json n'en fasse une liste
+    if isinstance(value, time.struct_time):
+        return {"__struct_time__": list(value)[:9]}
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _object_hook(d: dict):
+    if "__struct_time__" in d:
+        return time.struct_time(d["__struct_time__"])
+    return feedparser.FeedParserDict(d)
+
+
+def _payload(item: dict) -> str:
+    return json.dumps({
+        "entry": _jsonable(item.get("feed_entry") or {}),
+        "source": item.get("source"),
+        "category": item.get("category"),
+        "needs": item.get("needs") or [],
+        "image_url": item.get("image_url"),
+    }, ensure_ascii=False)
+
+
+# ---- mise en file ----
+
+def enqueue_items(session, items):
+    """Met en file les tâches listées dans item["pending_tasks"] (une seule par contenu et tâche)."""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "content_url": item["url"],
+            "task": task,
+            "payload": _payload(item),
+            "priority": TASK_PRIORITY.get(task, 0),
+            "status": "pending",
+            "attempts": 0,
+            "run_after": now,
+            "created_at": now,
+        }
+        for item in items
+        for task in item.get("pending_tasks") or ()
+    ]
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        stmt = sqlite_insert(EnrichmentJob).values(rows[i:i + UPSERT_CHUNK])
+        session.execute(stmt.on_conflict_do_nothing(index_elements=["content_url", "task"]))
+    session.commit()
+
+
+def _enqueue_placeholder(session, job, image_url: str):
+    """Image trouvée par la tâche "page" : ses dimensions / son aperçu restent à calculer."""
+    payload = json.loads(job.payload)
+    payload["image_url"] = image_url
+    now = datetime.utcnow()
+    session.execute(sqlite_insert(EnrichmentJob).values(
+        content_url=job.content_url, task="placeholder", payload=json.dumps(payload, ensure_ascii=False),
+        priority=TASK_PRIORITY["placeholder"], status="pending", attempts=0, run_after=now, created_at=now,
+    ).on_conflict_do_nothing(index_elements=["content_url", "task"]))
+
+
+def pending_count(session) -> int:
+    return session.query(EnrichmentJob).filter(EnrichmentJob.status != "failed").count()
+
+
+# ---- exécution (threads : réseau uniquement, pas de base) ----
+
+def run_task(task: str, url: str, payload: dict, entry_deadline: float | None = None) -> dict:
+    """
+    Exécute une tâche et renvoie les champs trouvés. Lève une exception pour réessayer plus tard.
+    entry_deadline : secondes max pour une tâche "page" (au-delà, échec → nouvelle tentative).
+    """
+    entry = payload.get("entry") or feedparser.FeedParserDict()
+    if task == "page":
+        deadline = time.monotonic() + entry_deadline if entry_deadline else None
+        page = PageContext(url, headers=HTTP_HEADERS, deadline=deadline)
+        needs = payload.get("needs") or []
+        out = {}
+        if "published_at" in needs:
+            out["published_at"] = extract_entry_published(entry, url, page=page)
+        if "description" in needs:
+            out["description"] = best_description_for_entry(entry, url, page=page)
+        if "image_url" in needs:
+            out["image_url"] = extract_image_from_entry(entry, url, page=page)
+        if "title" in needs:
+            out["title"] = choose_title(entry, url, payload.get("source"), page=page)
+        if page.error is not None:
+            raise page.error      # page injoignable : on réessaiera
+        return out
+    if task == "profile_image":
+        return {"profile_image_url": profile_image(entry, url)}
+    if task == "logo":
+        return {"institution_logo_url": institution_logo(entry, url, defer_on_quota=True)}
+    if task == "placeholder":
+        return thumbnails.placeholder(payload["image_url"]) if payload.get("image_url") else {}
+    raise ValueError(f"tâche inconnue : {task}")
+
+
+# ---- écritures (thread qui vide la file) ----
+
+def _apply(session, job, fields: dict):
+    """Complète le contenu avec les champs trouvés (mêmes règles que save_items : on ne remplace que le vide)."""
+    row = session.query(Content).filter_by(url=job.content_url).one_or_none()
+    if row is None:
+        return
+    for key, value in fields.items():
+        if not value:
+            continue
+        current = getattr(row, key)
+        if key == "description":
+            if not current or len(current) < 50 or HTML_TAG_RE.search(current):
+                row.description = value
+        elif key == "title":
+            row.title = value      # titre tiré de la page demandé par une règle
+        elif not current:
+            setattr(row, key, value)
+    if job.task == "page":
+        _drop_if_not_pertinent(session, row)
+        if (fields.get("image_url") and row not in session.deleted
+                and row.image_url == fields["image_url"] and not row.image_placeholder):
+            _enqueue_placeholder(session, job, row.image_url)
+
+
+def _drop_if_not_pertinent(session, row):
+    # même filtre qu'en ingestion directe : sans description exploitable, le contenu n'est pas gardé
+    if not scan_pertinence({"url": row.url, "description": row.description}):
+        session.delete(row)
+
+
+def _fail(session, job, error: Exception):
+    job.attempts += 1
+    job.last_error = f"{type(error).__name__}: {error}"[:1000]
+    job.locked_at = None
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = "failed"
+        if job.task == "page":
+            row = session.query(Content).filter_by(url=job.content_url).one_or_none()
+            if row is not None:
+                _drop_if_not_pertinent(session, row)
+        return "failed"
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+    job.status = "pending"
+    job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+    return "retry"
+
+
+def _defer(job, until: datetime):
+    """Tâche remise en attente jusqu'à `until`, sans compter d'échec (quota épuisé)."""
+    job.status = "pending"
+    job.locked_at = None
+    job.run_after = until
+    return "deferred"
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(EnrichmentJob.status == "pending", EnrichmentJob.run_after <= now),
+        and_(EnrichmentJob.status == "running", EnrichmentJob.locked_at < now - LEASE),
+    )
+
+
+def _claim(session, limit: int, skip_tasks=()) -> list:
+    """Réserve jusqu'à `limit` tâches (priorité puis ancienneté). Sûr entre plusieurs process."""
+    now = datetime.utcnow()
+    ids = [
+        job_id for (job_id,) in session.query(EnrichmentJob.id)
+        .filter(_claimable(now), EnrichmentJob.task.notin_(list(skip_tasks)))
+        .order_by(EnrichmentJob.priority.desc(), EnrichmentJob.run_after, EnrichmentJob.id)
+        .limit(limit)
+    ]
+    claimed = []
+    for job_id in ids:
+        # UPDATE conditionnel : si un autre process l'a prise entre-temps, 0 ligne modifiée
+        n = (
+            session.query(EnrichmentJob)
+            .filter(EnrichmentJob.id == job_id, _claimable(now))
+            .update({"status": "running", "locked_at": now}, synchronize_session=False)
+        )
+        if n:
+            claimed.append(job_id)
+    session.commit()
+    if not claimed:
+        return []
+    return session.query(EnrichmentJob).filter(EnrichmentJob.id.in_(claimed)).all()
+
+
+def _prefetch_profiles(session):
+    """Avatars Bluesky de toutes les tâches "profile_image" disponibles, résolus par lots avant leur traitement."""
+    rows = (
+        session.query(EnrichmentJob.content_url, EnrichmentJob.payload)
+        .filter(_claimable(datetime.utcnow()), EnrichmentJob.task == "profile_image")
+    )
+    bsky_profiles.prefetch(
+        bluesky_actor(json.loads(payload, object_hook=_object_hook).get("entry"), url) for url, payload in rows
+    )
+
+
+def _prefetch_logos(session):
+    """
+    Logos des sites pas encore en cache, du site qui concerne le plus de contenus au moins utile.
+    Quota Google CSE épuisé : seuls les logos déclarés par les sites eux-mêmes sont encore trouvés.
+    Les tâches "logo" trouvent ensuite le cache.
+    """
+    sites = {}
+    rows = (
+        session.query(EnrichmentJob.content_url, EnrichmentJob.payload)
+        .filter(_claimable(datetime.utcnow()), EnrichmentJob.task == "logo")
+    )
+    for url, payload in rows:
+        entry = json.loads(payload, object_hook=_object_hook).get("entry")
+        prefix = logo_prefix(entry, url)
+        if prefix and not cached_logo_institution(entry, url):
+            count, _, _ = sites.get(prefix, (0, entry, url))
+            sites[prefix] = (count + 1, entry, url)
+    for count, entry, url in sorted(sites.values(), key=lambda site: -site[0]):
+        try:
+            institution_logo(entry, url, defer_on_quota=True)
+        except CseQuotaExhausted:
+            continue      # le site suivant déclare peut-être son logo
+
+
+def drain(session=None, max_workers: int = ENRICH_WORKERS,
+          task_deadlines: dict | None = None, entry_deadline: float | None = None) -> dict:
+    """
+    Vide la file : tâches exécutées par `max_workers` threads, résultats écrits au fil de l'eau.
+    S'arrête quand plus aucune tâche n'est disponible (celles en backoff attendent le run suivant).
+    task_deadlines : {tâche: time.monotonic() limite} ; passé ce moment, ce type de tâche n'est plus
+    lancé (il reste en file). entry_deadline : délai max d'une tâche "page" (voir run_task).
+    """
+    task_deadlines = task_deadlines or {}
+    own_session = session is None
+    session = session or SessionLocal()
+    stats = {"done": 0, "retry": 0, "failed": 0, "deferred": 0}
+    session.query(EnrichmentJob).filter(
+        EnrichmentJob.status == "failed", EnrichmentJob.created_at < datetime.utcnow() - FAILED_RETENTION
+    ).delete(synchronize_session=False)
+    session.commit()
+    if time.monotonic() < task_deadlines.get("profile_image", float("inf")):
+        _prefetch_profiles(session)
+    if time.monotonic() < task_deadlines.get("logo", float("inf")):
+        _prefetch_logos(session)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            running = {}
+            while True:
+                free = 2 * max_workers - len(running)   # un peu d'avance pour ne pas laisser de thread inactif
+                now = time.monotonic()
+                skip = {task for task, limit in task_deadlines.items() if now >= limit}
+                if free > 0 and not set(TASK_PRIORITY) <= skip:
+                    for job in _claim(session, free, skip):
+                        payload = json.loads(job.payload, object_hook=_object_hook)
+                        running[ex.submit(run_task, job.task, job.content_url, payload, entry_deadline)] = job
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    job = running.pop(fut)
+                    try:
+                        fields = fut.result()
+                    except CseQuotaExhausted:
+                        stats[_defer(job, cse_quota_resets_at())] += 1
+                    except Exception as e:
+                        stats[_fail(session, job, e)] += 1
+                    else:
+                        _apply(session, job, fields)
+                        session.delete(job)
+                        stats["done"] += 1
+                session.commit()
+    finally:
+        if own_session:
+            session.close()
+    return stats
+
+
+if __name__ == "__main__":
+    # vider la file à la main (ex : après un run interrompu)
+    print(drain())
@@ -0,0 +1,231 @@
+# fast_feed.py
+"""
+Lecture rapide des flux RSS / Atom : parsing XML incrémental (ElementTree.iterparse) qui s'arrête
+après max_entries entrées, au lieu de feedparser qui analyse et nettoie tout le document
+(des centaines d'entrées avec leur article complet pour certains flux, quand le worker en lit 2).
+Les entrées sont des FeedParserDict avec les champs lus par adapter_rss et les extracteurs :
+title, link, links (dont les enclosures), id, author, published(_parsed), updated(_parsed),
+summary (ou media:description), content, media_thumbnail, media_content.
+Le HTML des descriptions n'est pas nettoyé ici (strip_html s'en charge à la construction de l'item).
+Document mal formé (entités HTML, encodage inconnu...) ou qui n'est pas un flux : feedparser.
+"""
+import io
+import xml.etree.ElementTree as ET
+from datetime import timezone
+from urllib.parse import urljoin
+
+import feedparser
+from dateutil import parser as date_parser
+
+# ---- espaces de noms ----
+ATOM = "http://www.w3.org/2005/Atom"
+RSS1 = "http://purl.org/rss/1.0/"
+RSS090 = "http://my.netscape.com/rdf/simple/0.9/"
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+CONTENT = "http://purl.org/rss/1.0/modules/content/"
+DC = "http://purl.org/dc/elements/1.1/"
+MEDIA = "http://search.yahoo.com/mrss/"
+XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+_RSS_NS = ("", RSS1, RSS090)
+
+
+class NotAFeed(ValueError):
+    pass
+
+
+def _split(tag: str) -> tuple[str, str]:
+    """'{ns}local' -> (ns, local)."""
+    if tag.startswith("{"):
+        ns, _, local = tag[1:].partition("}")
+        return ns, local
+    return "", tag
+
+
+def _text(elem) -> str:
+    return "".join(elem.itertext()).strip()
+
+
+def _atom_text(elem) -> str:
+    """Contenu d'un élément Atom texte / html / xhtml."""
+    if elem.get("type") == "xhtml":
+        div = next(iter(elem), None)
+        if div is None:
+            return _text(elem)
+        for node in div.iter():
+            node.tag = _split(node.tag)[1]      # <p> et pas <html:p xmlns:html=...>
+        inner = (div.text or "") + "".join(ET.tostring(child, encoding="unicode") for child in div)
+        return inner.strip()
+    return _text(elem)
+
+
+def _parse_date(value: str):
+    """RFC 822 / ISO 8601 -> struct_time UTC comme feedparser (None si illisible)."""
+    try:
+        dt = date_parser.parse(value)
+    except (ValueError, OverflowError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.utctimetuple()
+
+
+def _date(entry, key: str, value: str):
+    entry[key] = value
+    entry[f"{key}_parsed"] = _parse_date(value)
+
+
+def _media(entry, key: str, elem):
+    entry.setdefault(key, []).append(feedparser.FeedParserDict(elem.attrib))
+
+
+def _rss_entry(item, base: str) -> feedparser.FeedParserDict:
+    entry = feedparser.FeedParserDict()
+    links = []
+    for child in item:
+        ns, local = _split(child.tag)
+        if ns in _RSS_NS:
+            if local == "title":
+                entry["title"] = _text(child)
+            elif local == "link" and _text(child):
+                entry["link"] = urljoin(base, _text(child))
+            elif local == "guid":
+                guid = _text(child)
+                entry["guidislink"] = child.get("isPermaLink", "true").lower() != "false"
+                # seul un guid permalien qui ressemble à une URL est résolu ; "g1" reste "g1" (curseur)
+                if entry["guidislink"] and (guid.startswith("/") or "://" in guid):
+                    guid = urljoin(base, guid)
+                entry["id"] = guid
+            elif local == "description":
+                entry["summary"] = _text(child)
+            elif local == "pubDate":
+                _date(entry, "published", _text(child))
+            elif local == "author":
+                entry["author"] = _text(child)
+            elif local == "enclosure" and child.get("url"):
+                links.append(feedparser.FeedParserDict(
+                    rel="enclosure", href=urljoin(base, child.get("url")),
+                    type=child.get("type", ""), length=child.get("length", ""),
+                ))
+        elif ns == CONTENT and local == "encoded":
+            entry.setdefault("content", []).append(
+                feedparser.FeedParserDict(type="text/html", language=None, base=base, value=_text(child))
+            )
+        elif ns == DC and local == "creator":
+            entry.setdefault("author", _text(child))
+        elif ns == DC and local == "date":
+            _date(entry, "updated", _text(child))
+        elif ns == MEDIA:
+            _media_children(entry, child)
+    # comme feedparser : guid permalien sans <link>
+    if "link" not in entry and entry.get("guidislink") and entry.get("id", "").startswith(("http://", "https://")):
+        entry["link"] = entry["id"]
+    if links:
+        entry["links"] = links
+    return entry
+
+
+def _media_children(entry, elem):
+    ns, local = _split(elem.tag)
+    if local == "thumbnail":
+        _media(entry, "media_thumbnail", elem)
+    elif local == "content":
+        _media(entry, "media_content", elem)
+        for child in elem:       # <media:content><media:thumbnail/></media:content>
+            if _split(child.tag) == (MEDIA, "thumbnail"):
+                _media(entry, "media_thumbnail", child)
+    elif local == "description":
+        entry.setdefault("summary", _text(elem))      # feedparser : media:description -> summary (YouTube)
+    elif local == "group":
+        for child in elem:
+            if _split(child.tag)[0] == MEDIA:
+                _media_children(entry, child)
+
+
+def _atom_entry(elem, base: str) -> feedparser.FeedParserDict:
+    base = urljoin(base, elem.get(XML_BASE, ""))
+    entry = feedparser.FeedParserDict()
+    links = []
+    for child in elem:
+        ns, local = _split(child.tag)
+        if ns == ATOM:
+            if local == "title":
+                entry["title"] = _atom_text(child)
+            elif local == "link" and child.get("href"):
+                links.append(feedparser.FeedParserDict(
+                    rel=child.get("rel", "alternate"), href=urljoin(base, child.get("href")),
+                    type=child.get("type", "text/html"), **({"length": child.get("length")} if child.get("length") else {}),
+                ))
+            elif local == "id":
+                entry["id"] = urljoin(urljoin(base, child.get(XML_BASE, "")), _text(child))
+            elif local in ("published", "updated"):
+                _date(entry, local, _text(child))
+            elif local == "author":
+                name = child.find(f"{{{ATOM}}}name")
+                if name is not None:
+                    entry["author"] = _text(name)
+            elif local == "summary":
+                entry["summary"] = _atom_text(child)
+            elif local == "content":
+                entry.setdefault("content", []).append(feedparser.FeedParserDict(
+                    type="application/xhtml+xml" if child.get("type") == "xhtml" else "text/html",
+                    language=None, base=base, value=_atom_text(child),
+                ))
+        elif ns == MEDIA:
+            _media_children(entry, child)
+    if links:
+        entry["links"] = links
+        alternate = next((link for link in links if link["rel"] == "alternate"), None)
+        if alternate:
+            entry["link"] = alternate["href"]
+    return entry
+
+
+def iter_entries(content: bytes, base: str = ""):
+    """
+    Entrées du flux dans l'ordre du document, lues au fil du parsing.
+    Lève ET.ParseError (document mal formé) ou NotAFeed.
+    """
+    version = None      # "rss20", "rss10" ou "atom10" une fois la racine lue
+    for event, elem in ET.iterparse(io.BytesIO(content.lstrip()), events=("start", "end")):
+        ns, local = _split(elem.tag)
+        if version is None:
+            if event != "start":
+                continue
+            if local == "rss" and ns == "":
+                version = "rss20"
+            elif (ns, local) == (ATOM, "feed"):
+                version = "atom10"
+                base = urljoin(base, elem.get(XML_BASE, ""))
+            elif (ns, local) == (RDF, "RDF"):
+                version = "rss10"
+            else:
+                raise NotAFeed(elem.tag)
+            continue
+        if event != "end":
+            continue
+        if version == "atom10" and (ns, local) == (ATOM, "entry"):
+            yield _atom_entry(elem, base)
+            elem.clear()
+        elif version != "atom10" and local == "item" and ns in _RSS_NS:
+            yield _rss_entry(elem, base)
+            elem.clear()
+
+
+def parse(content: bytes, max_entries: int | None = None, response_headers: dict | None = None):
+    """
+    Flux parsé (FeedParserDict : .entries, .bozo), avec au plus `max_entries` entrées.
+    Même signature que feedparser.parse pour le reste : en cas d'échec, c'est lui qui parse le document entier.
+    """
+    headers = response_headers or {}
+    base = headers.get("content-location") or ""
+    entries = []
+    try:
+        for entry in iter_entries(content, base):
+            if "summary" not in entry and entry.get("content"):
+                entry["summary"] = entry["content"][0]["value"]     # comme feedparser
+            entries.append(entry)
+            if max_entries and len(entries) >= max_entries:
+                break
+    except (ET.ParseError, NotAFeed, UnicodeError):
+        return feedparser.parse(content, response_headers=response_headers)
+    return feedparser.FeedParserDict(entries=entries, feed=feedparser.FeedParserDict(), bozo=0)
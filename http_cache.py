@@ -0,0 +1,329 @@
+# http_cache.py
+"""
+Cache HTTP persistant sur disque (pages d'articles, API Bluesky/Mastodon, Google CSE).
+- Respecte Cache-Control / Expires / ETag / Last-Modified (RFC 9111, cache privé)
+- Corps stockés compressés (zlib), index SQLite
+- Taille plafonnée, éviction LRU
+- Corps partiels (lecture arrêtée après le <head>) marqués comme tels
+- Cache négatif (URL en erreur, avec TTL) et état des disjoncteurs par hôte (voir http_client)
+Partagé entre threads et entre processus (SQLite WAL).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# =========================
+# Réglages
+# =========================
+DEFAULT_CACHE_DIR = Path(os.getenv("HTTP_CACHE_PATH", str(Path.home() / ".cache" / "agregateur_http_cache")))
+DEFAULT_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_MB", "256")) * 1024 * 1024
+HEURISTIC_MAX_AGE = 24 * 3600      # fraîcheur heuristique max (10 % de l'âge du Last-Modified)
+_CACHEABLE_STATUS = {200, 203}
+
+# en-têtes qui ne décrivent plus le corps stocké (déjà décodé)
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+_CC_RE = re.compile(r"\s*([A-Za-z0-9_-]+)\s*(?:=\s*(\"[^\"]*\"|[^,]*))?\s*(?:,|$)")
+
+
+def parse_cache_control(value: str | None) -> dict:
+    """'max-age=60, no-cache' -> {'max-age': '60', 'no-cache': None}"""
+    out = {}
+    for m in _CC_RE.finditer(value or ""):
+        if m.group(1):
+            out[m.group(1).lower()] = (m.group(2) or "").strip('"') or None
+    return out
+
+
+def _http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except Exception:
+        return None
+
+
+def _int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers, now: float) -> float:
+    """
+    Durée de fraîcheur (en secondes) d'une réponse, d'après RFC 9111 §4.2.1 :
+    max-age, puis Expires - Date, puis heuristique 10 % (Last-Modified).
+    """
+    cc = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in cc:
+        return 0
+    max_age = _int(cc.get("max-age"))
+    if max_age is not None:
+        return max(0, max_age)
+    date = _http_date(headers.get("Date")) or now
+    expires = headers.get("Expires")
+    if expires is not None:
+        exp = _http_date(expires)
+        return max(0, exp - date) if exp else 0   # Expires invalide = déjà expiré
+    last_mod = _http_date(headers.get("Last-Modified"))
+    if last_mod and date > last_mod:
+        return min((date - last_mod) * 0.1, HEURISTIC_MAX_AGE)
+    return 0
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class CachedEntry:
+    def __init__(self, row):
+        (self.key, self.url, self.status, headers, self.vary, self.stored_at,
+         self.expires_at, self.size, complete) = row
+        self.complete = bool(complete)
+        self.headers = CaseInsensitiveDict(json.loads(headers))
+        self.vary = json.loads(self.vary or "{}")
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+    def matches(self, request_headers: dict | None) -> bool:
+        """Vary : les en-têtes de requête listés doivent être identiques."""
+        req = CaseInsensitiveDict(request_headers or {})
+        return all(req.get(h) == v for h, v in self.vary.items())
+
+    @property
+    def validators(self) -> dict:
+        out = {}
+        if self.headers.get("ETag"):
+            out["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            out["If-Modified-Since"] = self.headers["Last-Modified"]
+        return out
+
+
+class HttpCache:
+    """
+    Index SQLite (métadonnées + dernier accès) + un fichier compressé par corps.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.bodies = self.directory / "bodies"
+        self.bodies.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.directory / "index.sqlite", timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                vary TEXT,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                complete INTEGER NOT NULL DEFAULT 1
+            )""")
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(responses)")}
+        if "complete" not in cols:  # index créé avant les lectures partielles
+            self._db.execute("ALTER TABLE responses ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS negative (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER,
+                error TEXT,
+                expires_at REAL NOT NULL
+            )""")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS hosts (
+                host TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                opened_until REAL NOT NULL,
+                cooldown REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._db.commit()
+
+    def _body_path(self, key: str) -> Path:
+        return self.bodies / key[:2] / f"{key}.z"
+
+    # ---- lecture ----
+    def lookup(self, url: str, request_headers: dict | None = None, accept_partial: bool = False) -> CachedEntry | None:
+        """Entrée du cache pour `url` ; un corps partiel n'est renvoyé que si accept_partial."""
+        key = cache_key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, url, status, headers, vary, stored_at, expires_at, size, complete"
+                " FROM responses WHERE key=?",
+                (key,),
+            ).fetchone()
+        if not row:
+            return None
+        entry = CachedEntry(row)
+        if not entry.complete and not accept_partial:
+            return None
+        if not entry.matches(request_headers) or not self._body_path(key).exists():
+            return None
+        return entry
+
+    def to_response(self, entry: CachedEntry) -> requests.Response | None:
+        """Reconstruit un requests.Response depuis le cache (et marque l'entrée comme utilisée)."""
+        try:
+            body = zlib.decompress(self._body_path(entry.key).read_bytes())
+        except (OSError, zlib.error):
+            return None
+        with self._lock:
+            self._db.execute("UPDATE responses SET last_access=? WHERE key=?", (time.time(), entry.key))
+            self._db.commit()
+        resp = requests.Response()
+        resp.status_code = entry.status
+        resp._content = body
+        resp.headers = CaseInsensitiveDict(entry.headers)
+        resp.url = entry.url
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        resp.from_cache = True
+        resp.partial = not entry.complete
+        return resp
+
+    # ---- écriture ----
+    def store(self, url: str, request_headers: dict | None, resp: requests.Response, complete: bool = True) -> bool:
+        """
+        Stocke la réponse si elle est cachable. Renvoie True si stockée.
+        complete=False : seul le début du corps a été lu (servi uniquement aux lectures partielles) ;
+        un corps partiel ne remplace jamais un corps complet déjà en cache.
+        """
+        if resp.status_code not in _CACHEABLE_STATUS:
+            return False
+        req_cc = parse_cache_control(CaseInsensitiveDict(request_headers or {}).get("Cache-Control"))
+        cc = parse_cache_control(resp.headers.get("Cache-Control"))
+        if "no-store" in cc or "no-store" in req_cc:
+            return False
+        vary_names = [h.strip() for h in (resp.headers.get("Vary") or "").split(",") if h.strip()]
+        if "*" in vary_names:
+            return False
+        req = CaseInsensitiveDict(request_headers or {})
+        vary = {h: req.get(h) for h in vary_names if h.lower() != "accept-encoding"}
+
+        headers = {k: v for k, v in resp.headers.items() if k.lower() not in _DROP_HEADERS}
+        body = zlib.compress(resp.content or b"", 6)
+        key = cache_key(url)
+        now = time.time()
+        age = _int(resp.headers.get("Age")) or 0
+        expires_at = now + freshness_lifetime(resp.headers, now) - age
+
+        path = self._body_path(key)
+        with self._lock:
+            if not complete:
+                row = self._db.execute("SELECT complete FROM responses WHERE key=?", (key,)).fetchone()
+                if row and row[0] and path.exists():
+                    return False
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, url, status, headers, vary, stored_at, expires_at, size, last_access, complete)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, resp.status_code, json.dumps(headers), json.dumps(vary),
+                 now, expires_at, len(body), now, int(complete)),
+            )
+            self._db.execute("DELETE FROM negative WHERE key=?", (key,))
+            self._db.commit()
+        self._evict()
+        return True
+
+    def refresh(self, entry: CachedEntry, not_modified: requests.Response):
+        """304 reçu : met à jour les en-têtes et la fraîcheur de l'entrée (RFC 9111 §4.3.4)."""
+        headers = dict(entry.headers)
+        for k, v in not_modified.headers.items():
+            if k.lower() not in _DROP_HEADERS:
+                headers[k] = v
+        now = time.time()
+        expires_at = now + freshness_lifetime(CaseInsensitiveDict(headers), now)
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET headers=?, stored_at=?, expires_at=?, last_access=? WHERE key=?",
+                (json.dumps(headers), now, expires_at, now, entry.key),
+            )
+            self._db.commit()
+        entry.headers = CaseInsensitiveDict(headers)
+        entry.expires_at = expires_at
+
+    # ---- cache négatif ----
+    def negative_lookup(self, url: str) -> tuple[int | None, str] | None:
+        """(statut HTTP ou None si erreur réseau, message) si l'URL a échoué récemment."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, error FROM negative WHERE key=? AND expires_at > ?",
+                (cache_key(url), time.time()),
+            ).fetchone()
+        return (row[0], row[1] or "") if row else None
+
+    def negative_store(self, url: str, status: int | None, error: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM negative WHERE expires_at <= ?", (now,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO negative (key, url, status, error, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (cache_key(url), url, status, error[:500], now + ttl),
+            )
+            self._db.commit()
+
+    # ---- disjoncteurs par hôte ----
+    def load_host(self, host: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, opened_until, cooldown FROM hosts WHERE host=?", (host,)
+            ).fetchone()
+        return {"state": row[0], "opened_until": row[1], "cooldown": row[2]} if row else None
+
+    def save_host(self, host: str, state: str, opened_until: float, cooldown: float):
+        with self._lock:
+            if state == "closed":
+                self._db.execute("DELETE FROM hosts WHERE host=?", (host,))
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO hosts (host, state, opened_until, cooldown, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (host, state, opened_until, cooldown, time.time()),
+                )
+            self._db.commit()
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes."""
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            target = self.max_bytes * 0.9
+            victims = []
+            for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+                if total <= target:
+                    break
+                victims.append(key)
+                total -= size
+            self._db.executemany("DELETE FROM responses WHERE key=?", [(k,) for k in victims])
+            self._db.commit()
+        for key in victims:
+            try:
+                self._body_path(key).unlink()
+            except OSError:
+                pass
@@ -0,0 +1,533 @@
+# http_client.py
+"""
+Couche HTTP commune du projet (pages, flux, API Bluesky/Mastodon, Google CSE).
+- Une seule requests.Session : connexions keep-alive réutilisées, pools par hôte
+- Retries, en-têtes et timeouts identiques pour tous les modules
+- Décompression gzip/deflate (et br si le paquet brotli est installé)
+- Limite le nombre de requêtes simultanées vers un même hôte (flux + pages)
+- Débit par hôte limité (seau à jetons), 429/503 : Retry-After respecté pour tout l'hôte
+- Disjoncteur par hôte (fermé / ouvert / semi-ouvert) et cache négatif des URL en échec,
+  conservés d'un run à l'autre : un hôte mort ne coûte plus un timeout par requête
+- Lecture en streaming plafonnée, avec arrêt possible dès la fin du <head>
+- Garde sur le type de contenu : PDF lus partiellement (métadonnées), audio/vidéo jamais téléchargés
+- Cache HTTP persistant sur disque (voir http_cache.py)
+- Utilisable depuis plusieurs threads (ingestion concurrente)
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from requests.structures import CaseInsensitiveDict
+
+from http_cache import HttpCache, parse_cache_control
+
+try:  # décodage "br" par urllib3 si brotli (ou brotlicffi) est présent
+    import brotli  # noqa: F401
+    _ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        _ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        _ACCEPT_ENCODING = "gzip, deflate"
+
+# ---- paramètres ----
+MAX_PER_HOST = 2   # requêtes simultanées max vers un même hôte
+POOL_HOSTS = 64    # nb d'hôtes dont on garde les connexions ouvertes
+HOST_RATE = float(os.getenv("HTTP_HOST_RATE", "2"))     # requêtes / seconde / hôte (en régime établi)
+HOST_BURST = int(os.getenv("HTTP_HOST_BURST", "4"))     # rafale autorisée au démarrage
+THROTTLE_RETRIES = 2       # nouvelles tentatives après un 429/503
+MAX_RETRY_AFTER = 60.0     # au-delà, on abandonne la requête (l'hôte reste en pause ce temps-là)
+DEFAULT_RETRY_AFTER = 2.0  # 429/503 sans Retry-After
+
+# disjoncteur : ouvert si au moins la moitié des dernières requêtes vers l'hôte ont échoué
+BREAKER_WINDOW = 10            # dernières requêtes prises en compte
+BREAKER_MIN_CALLS = 3          # pas de décision sur moins de requêtes
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_COOLDOWN = 3600.0      # 1re ouverture ; doublé à chaque rechute (essai semi-ouvert raté)
+BREAKER_MAX_COOLDOWN = 7 * 24 * 3600.0
+
+# cache négatif (requêtes passant par le cache uniquement)
+NEGATIVE_TTL_GONE = 7 * 24 * 3600     # 404 / 410
+NEGATIVE_TTL_ERROR = 6 * 3600         # erreur réseau, timeout, 5xx
+CACHE_ENABLED = os.getenv("HTTP_CACHE", "1") != "0"
+
+MAX_HEAD_BYTES = 300_000     # lecture "head seul" : on s'arrête avant si </head> est atteint
+MAX_HTML_BYTES = 1_000_000   # lecture complète d'une page : au-delà on coupe
+_HEAD_END_RE = re.compile(rb"</head\s*>|<body[\s>]", re.IGNORECASE)
+PDF_PROBE_BYTES = 128_000    # début d'un PDF : dictionnaire Info / XMP des PDF linéarisés
+
+# liens dont l'extension suffit à savoir qu'on n'aura pas de HTML
+_PDF_EXTENSIONS = (".pdf",)
+_MEDIA_EXTENSIONS = (
+    ".mp3", ".m4a", ".aac", ".ogg", ".oga", ".opus", ".wav", ".flac",
+    ".mp4", ".m4v", ".mov", ".webm", ".avi", ".mkv",
+    ".zip", ".gz", ".epub",
+)
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10.0
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)   # (connect, read)
+
+# --- Headers réseau plus "réalistes" (communs à tous les modules)
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Accept-Encoding": _ACCEPT_ENCODING,
+}
+
+RETRIES = Retry(
+    total=2,                 # 2 tentatives en plus de la 1ère
+    backoff_factor=0.3,
+    status_forcelist=[500, 502, 504],   # 429/503 : gérés dans get() (Retry-After partagé par l'hôte)
+    allowed_methods=["HEAD", "GET", "OPTIONS"],
+    raise_on_status=False,
+    respect_retry_after_header=False,
+)
+
+_HOST_SLOTS: dict[str, threading.BoundedSemaphore] = {}
+_HOST_SLOTS_LOCK = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Seau à jetons d'un hôte : `rate` requêtes/s en moyenne, rafale de `burst`.
+    pause(s) vide le seau et bloque l'hôte s secondes (Retry-After).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.01)
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_time(self, now: float) -> float:
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Bloque jusqu'à obtenir un jeton."""
+        while True:
+            with self._lock:
+                wait = self._wait_time(time.monotonic())
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+
+_BUCKETS: dict[str, TokenBucket] = {}
+
+class HostUnavailable(requests.ConnectionError):
+    """Hôte en échec (disjoncteur ouvert) ou URL en échec récent (cache négatif) : pas de requête."""
+
+
+# erreurs imputables à l'hôte (pas à l'URL mal formée, par ex.)
+_HOST_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur d'un hôte :
+    - fermé : requêtes normales ; ouvert si trop d'échecs sur les BREAKER_WINDOW dernières
+    - ouvert : aucune requête jusqu'à opened_until (HostUnavailable)
+    - semi-ouvert : une seule requête d'essai ; succès → fermé, échec → ouvert (délai doublé)
+    L'état ouvert est enregistré dans le cache disque et retrouvé au run suivant.
+    """
+
+    def __init__(self, host: str, state: str = "closed", opened_until: float = 0.0,
+                 cooldown: float = BREAKER_COOLDOWN):
+        self.host = host
+        self.state = state if state in ("closed", "open") else "open"
+        self.opened_until = opened_until
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)
+        self._trial_running = False
+        self._trial_thread = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.time() < self.opened_until:
+                    return False
+                self.state = "half_open"
+                self._trial_running = False
+            if self._trial_running:      # semi-ouvert : un seul essai à la fois
+                return False
+            self._trial_running = True
+            self._trial_thread = threading.get_ident()
+            return True
+
+    def end_trial(self):
+        """
+        Fin de la requête de ce thread : si c'était l'essai semi-ouvert et qu'aucun résultat n'a été
+        enregistré (exception autre qu'une erreur réseau), l'essai est rendu pour ne pas bloquer l'hôte.
+        """
+        with self._lock:
+            if self._trial_running and self._trial_thread == threading.get_ident():
+                self._trial_running = False
+                self._trial_thread = None
+
+    def record(self, ok: bool) -> bool:
+        """Enregistre le résultat d'une requête. Renvoie True si l'état a changé."""
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_running = False
+                if ok:
+                    self.state = "closed"
+                    self.cooldown = BREAKER_COOLDOWN
+                    self.outcomes.clear()
+                else:
+                    self._open(min(BREAKER_MAX_COOLDOWN, self.cooldown * 2))
+                return True
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if (self.state == "closed" and len(self.outcomes) >= BREAKER_MIN_CALLS
+                    and failures / len(self.outcomes) >= BREAKER_FAILURE_RATE):
+                self._open(self.cooldown)
+                return True
+            return False
+
+    def _open(self, cooldown: float):
+        self.state = "open"
+        self.cooldown = cooldown
+        self.opened_until = time.time() + cooldown
+        self.outcomes.clear()
+        print(f"[http] {self.host} : trop d'échecs, hôte ignoré pendant {cooldown / 3600:.1f} h")
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+
+_CACHE: HttpCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def _mount_adapters(session: requests.Session):
+    # un pool par hôte, dimensionné sur la limite de requêtes simultanées par hôte
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=MAX_PER_HOST, max_retries=RETRIES)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+SESSION = requests.Session()
+SESSION.headers.update(DEFAULT_HEADERS)
+_mount_adapters(SESSION)
+
+
+def set_max_per_host(n: int):
+    """Change la limite par hôte (à appeler avant de lancer l'ingestion)."""
+    global MAX_PER_HOST
+    with _HOST_SLOTS_LOCK:
+        MAX_PER_HOST = max(1, int(n))
+        _HOST_SLOTS.clear()
+    _mount_adapters(SESSION)
+
+
+def set_host_rate(rate: float, burst: int | None = None):
+    """Change le débit autorisé par hôte (à appeler avant de lancer l'ingestion)."""
+    global HOST_RATE, HOST_BURST
+    with _HOST_SLOTS_LOCK:
+        HOST_RATE = float(rate)
+        if burst is not None:
+            HOST_BURST = int(burst)
+        _BUCKETS.clear()
+
+
+def _timeout(timeout):
+    """Timeout (connect, read) homogène : un nombre seul ne fixe que la lecture."""
+    if timeout is None:
+        return DEFAULT_TIMEOUT
+    if isinstance(timeout, (int, float)):
+        return (CONNECT_TIMEOUT, timeout)
+    return timeout
+
+
+def host_of(url: str | None) -> str:
+    try:
+        return (urlparse(url or "").netloc or "").lower()
+    except Exception:
+        return ""
+
+
+def _slot_for(host: str) -> threading.BoundedSemaphore:
+    with _HOST_SLOTS_LOCK:
+        sem = _HOST_SLOTS.get(host)
+        if sem is None:
+            sem = _HOST_SLOTS[host] = threading.BoundedSemaphore(MAX_PER_HOST)
+        return sem
+
+
+def bucket_for(host: str) -> TokenBucket:
+    with _HOST_SLOTS_LOCK:
+        bucket = _BUCKETS.get(host)
+        if bucket is None:
+            bucket = _BUCKETS[host] = TokenBucket(HOST_RATE, HOST_BURST)
+        return bucket
+
+
+@contextmanager
+def host_slot(url: str | None):
+    """
+    Bloque tant que l'hôte de `url` a déjà MAX_PER_HOST requêtes en cours,
+    puis attend un jeton du seau de l'hôte (débit max, pause Retry-After).
+    """
+    host = host_of(url)
+    sem = _slot_for(host)
+    sem.acquire()
+    try:
+        bucket_for(host).acquire()
+        yield
+    finally:
+        sem.release()
+
+
+def breaker_for(host: str) -> CircuitBreaker:
+    with _HOST_SLOTS_LOCK:
+        breaker = _BREAKERS.get(host)
+    if breaker is not None:
+        return breaker
+    store = get_cache()
+    saved = store.load_host(host) if store else None
+    with _HOST_SLOTS_LOCK:
+        return _BREAKERS.setdefault(host, CircuitBreaker(host, **(saved or {})))
+
+
+def _record_outcome(host: str, ok: bool):
+    breaker = breaker_for(host)
+    if breaker.record(ok):
+        store = get_cache()
+        if store is not None and breaker.state != "half_open":
+            store.save_host(host, breaker.state, breaker.opened_until, breaker.cooldown)
+
+
+def retry_after_seconds(resp: requests.Response) -> float:
+    """Délai demandé par Retry-After (secondes ou date HTTP), DEFAULT_RETRY_AFTER sinon."""
+    value = (resp.headers.get("Retry-After") or "").strip()
+    if value.isdigit():
+        return float(value)
+    if value:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            pass
+    return DEFAULT_RETRY_AFTER
+
+
+def get_cache() -> HttpCache | None:
+    """Cache HTTP partagé (créé au premier usage), ou None s'il est désactivé."""
+    global _CACHE
+    if not CACHE_ENABLED:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = HttpCache()
+        return _CACHE
+
+
+def kind_from_url(url: str | None) -> str | None:
+    """'pdf' / 'media' d'après l'extension du lien, None si on ne peut pas savoir sans requête."""
+    path = urlparse(url or "").path.lower()
+    if path.endswith(_PDF_EXTENSIONS):
+        return "pdf"
+    if path.endswith(_MEDIA_EXTENSIONS):
+        return "media"
+    return None
+
+
+def content_kind(content_type: str | None) -> str:
+    """Content-Type -> 'html' / 'pdf' / 'media' (corps inutile pour nous) / 'other'."""
+    ct = (content_type or "").split(";")[0].strip().lower()
+    if ct in ("text/html", "application/xhtml+xml"):
+        return "html"
+    if ct == "application/pdf":
+        return "pdf"
+    if ct.startswith(("audio/", "video/", "image/")) or ct in ("application/octet-stream", "application/zip"):
+        return "media"
+    return "other"
+
+
+def _read_limited(resp: requests.Response, max_bytes: int, head_only: bool) -> bool:
+    """
+    Lit le corps en streaming jusqu'à max_bytes (ou jusqu'à </head> si head_only),
+    puis ferme la connexion. Renvoie True si le corps n'a pas été lu en entier
+    (arrêt après le <head>, plafond max_bytes atteint, ou moins d'octets que le Content-Length annoncé).
+    """
+    buf = bytearray()
+    truncated = False
+    try:
+        for chunk in resp.iter_content(chunk_size=16 * 1024):
+            # on recherche la fin du <head> autour du nouveau morceau seulement
+            start = max(0, len(buf) - 16)
+            buf += chunk
+            if head_only and _HEAD_END_RE.search(buf, start):
+                truncated = True
+                break
+            if len(buf) >= max_bytes:
+                truncated = True
+                break
+    finally:
+        resp.close()
+    expected = resp.headers.get("Content-Length")
+    if (not truncated and expected and expected.isdigit() and not resp.headers.get("Content-Encoding")
+            and len(buf) < int(expected)):
+        truncated = True
+    resp._content = bytes(buf[:max_bytes])
+    return truncated
+
+
+def get(url: str, headers: dict | None = None, cache: bool = True, timeout=None,
+        head_only: bool = False, max_bytes: int | None = None, retry_throttled: bool = True,
+        read_media: bool = False, **kwargs) -> requests.Response:
+    """
+    GET via la session partagée, en respectant la limite par hôte et en passant par le cache disque :
+    - réponse fraîche en cache → servie localement, sans réseau
+    - réponse périmée avec ETag/Last-Modified → GET conditionnel, 304 = corps du cache
+    `cache=False` pour les appels qui gèrent eux-mêmes leurs validateurs (flux RSS).
+    Lecture plafonnée en streaming :
+    - max_bytes : on ne lit pas plus que max_bytes octets du corps
+    - head_only : on s'arrête dès </head> (ou MAX_HEAD_BYTES)
+    - resp.partial vaut True dès que le corps n'a pas été lu en entier : stocké comme partiel
+    - d'après le Content-Type (resp.content_kind) : PDF lu sur PDF_PROBE_BYTES, audio/vidéo/image/binaire
+      non lus, sauf read_media=True (images des vignettes) : lus jusqu'à max_bytes, partial au-delà
+    429/503 : l'hôte est mis en pause selon Retry-After, puis jusqu'à THROTTLE_RETRIES nouvelles tentatives
+    (aucune si retry_throttled=False : API facturée à la requête, la réponse 429/503 est renvoyée).
+    Hôte en échec (disjoncteur ouvert) ou URL en erreur réseau récente → HostUnavailable, sans requête ;
+    URL récemment en 404/410/5xx → réponse reconstituée avec ce statut.
+    """
+    if head_only and not max_bytes:
+        max_bytes = MAX_HEAD_BYTES
+    params = kwargs.pop("params", None)
+    if params:
+        url = requests.Request("GET", url, params=params).prepare().url
+    headers = dict(headers or {})
+
+    store = get_cache() if cache else None
+    req_cc = parse_cache_control(CaseInsensitiveDict(headers).get("Cache-Control"))
+    if "no-store" in req_cc:
+        store = None
+
+    entry = store.lookup(url, headers, accept_partial=head_only) if store else None
+    if entry is not None:
+        if entry.is_fresh() and "no-cache" not in req_cc:
+            resp = store.to_response(entry)
+            if resp is not None:
+                return resp
+        for k, v in entry.validators.items():
+            headers.setdefault(k, v)
+
+    host = host_of(url)
+    negative = store.negative_lookup(url) if store else None
+    if negative is not None:
+        status, error = negative
+        if status is None:
+            raise HostUnavailable(f"{url} : en échec récent ({error})")
+        return _negative_response(url, status)
+    breaker = breaker_for(host)
+    if not breaker.allow():
+        raise HostUnavailable(f"{host} : hôte en échec, requête non envoyée")
+
+    try:
+        retries = THROTTLE_RETRIES if retry_throttled else 0
+        for attempt in range(retries + 1):
+            try:
+                resp = _send(url, headers, timeout, head_only, max_bytes, read_media, **kwargs)
+            except _HOST_ERRORS as e:
+                _record_outcome(host, False)
+                if store is not None:
+                    store.negative_store(url, None, f"{type(e).__name__}", NEGATIVE_TTL_ERROR)
+                raise
+            if resp.status_code not in (429, 503):
+                break
+            # l'hôte nous freine : tout l'hôte est mis en pause, pas seulement ce thread
+            delay = retry_after_seconds(resp)
+            bucket_for(host_of(url)).pause(min(delay, MAX_RETRY_AFTER))
+            if delay > MAX_RETRY_AFTER or attempt == retries:
+                break
+            print(f"[http] {resp.status_code} {host_of(url)} : nouvelle tentative dans {delay:.0f}s")
+            resp.close()      # réponse abandonnée : sa connexion retourne au pool
+
+        _record_outcome(host, resp.status_code < 500 and resp.status_code != 429)
+    finally:
+        breaker.end_trial()     # TooManyRedirects, InvalidURL... : l'essai semi-ouvert n'a rien enregistré
+    if store is not None and resp.status_code in (404, 410):
+        store.negative_store(url, resp.status_code, "gone", NEGATIVE_TTL_GONE)
+    elif store is not None and resp.status_code >= 500:
+        store.negative_store(url, resp.status_code, "server error", NEGATIVE_TTL_ERROR)
+
+    if store is None or (max_bytes and resp.content_kind == "media"):   # corps non lu : rien à stocker
+        return resp
+    if entry is not None and resp.status_code == 304:
+        store.refresh(entry, resp)
+        cached = store.to_response(entry)
+        if cached is not None:
+            return cached
+    store.store(url, headers, resp, complete=not resp.partial)
+    return resp
+
+
+def _negative_response(url: str, status: int) -> requests.Response:
+    """Réponse reconstituée pour une URL en échec récent (404/410/5xx), sans requête."""
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = b""
+    resp.url = url
+    resp.from_cache = True
+    resp.partial = False
+    resp.content_kind = "other"
+    return resp
+
+
+def _send(url: str, headers: dict, timeout, head_only: bool, max_bytes: int | None, read_media: bool = False,
+          **kwargs) -> requests.Response:
+    """Une requête réseau (créneau + jeton de l'hôte), corps lu selon max_bytes / head_only / Content-Type."""
+    with host_slot(url):
+        if max_bytes:
+            resp = SESSION.get(url, headers=headers, timeout=_timeout(timeout), stream=True, **kwargs)
+            # les en-têtes sont arrivés, le corps pas encore : on décide quoi en lire
+            resp.content_kind = content_kind(resp.headers.get("Content-Type"))
+            length = resp.headers.get("Content-Length") or ""
+            if resp.content_kind == "media" and read_media and not (length.isdigit() and int(length) > max_bytes):
+                resp.partial = _read_limited(resp, max_bytes, head_only=False)
+            elif resp.content_kind == "media":
+                resp.close()
+                resp._content = b""
+                resp.partial = True
+            elif resp.content_kind == "pdf":
+                _read_limited(resp, min(max_bytes, PDF_PROBE_BYTES), head_only=False)
+                resp.partial = True
+            else:
+                resp.partial = _read_limited(resp, max_bytes, head_only and resp.content_kind == "html")
+        else:
+            resp = SESSION.get(url, headers=headers, timeout=_timeout(timeout), **kwargs)
+            resp.content_kind = content_kind(resp.headers.get("Content-Type"))
+            resp.partial = False
+    return resp
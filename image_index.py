@@ -0,0 +1,228 @@
+# image_index.py
+"""
+Index d'empreintes d'images (dHash 64 bits calculé avec Pillow) pour écarter les fausses images
+d'en-tête : logos, avatars, images génériques d'un site.
+- chaque URL d'image est hachée une seule fois (cache SQLite, HASH_TTL), sur sa vignette hero
+  (thumbnails.py) : le même téléchargement sert à l'aperçu flou et à la carte
+- une image unie ou presque (fond de couleur, dégradé) n'a pas d'empreinte exploitable : toutes se
+  ressemblent, elle n'est donc ni indexée ni rejetée
+- les logos (institution_logo) et avatars (profile_image) trouvés sont enregistrés comme "logo" / "avatar"
+- une même image en tête de PLACEHOLDER_MIN_PAGES articles différents d'un site devient "placeholder" de ce site
+- la recherche tolère HASH_DISTANCE bits d'écart (même logo servi sous une autre URL, recompressé,
+  redimensionné) : l'empreinte est découpée en 4 bandes de 16 bits et, à HASH_DISTANCE < 4, une image
+  proche a forcément une bande identique → 4 lectures de dictionnaire par recherche
+Partagé entre threads et entre processus (SQLite WAL).
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from PIL import Image, UnidentifiedImageError
+
+import thumbnails
+
+# ---- paramètres ----
+INDEX_PATH = Path(os.getenv(
+    "IMAGE_INDEX_PATH", str(Path.home() / ".cache" / "agregateur_images" / "index.sqlite")
+))
+HASH_DISTANCE = 3           # bits d'écart tolérés (< 4 : voir les bandes)
+PLACEHOLDER_MIN_PAGES = 3   # même image en tête de 3 articles du site : image générique
+HASH_TTL = 30 * 24 * 3600   # une URL est re-téléchargée au plus une fois par mois
+MIN_CONTRAST = 12           # écart de gris min. (0-255) entre pixels de l'image 9x8 : en dessous, image unie
+MIN_HASH_BITS = 8           # empreinte presque toute à 0 ou à 1 : image sans motif
+_BANDS = 4
+
+
+def informative(h: int) -> bool:
+    """False pour une empreinte sans motif (image unie, dégradé) : elle ressemble à toutes les autres."""
+    return MIN_HASH_BITS <= h.bit_count() <= 64 - MIN_HASH_BITS
+
+
+def dhash(img: Image.Image) -> int | None:
+    """
+    Empreinte 64 bits : le pixel est-il plus clair que son voisin de droite (image 9x8 en niveaux de gris).
+    None pour une image unie ou presque.
+    """
+    px = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    if max(px) - min(px) < MIN_CONTRAST:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits if informative(bits) else None
+
+
+def _bands(h: int):
+    return [(i, (h >> (16 * i)) & 0xFFFF) for i in range(_BANDS)]
+
+
+def _site(url: str | None) -> str:
+    return (urlparse(url or "").netloc or "").lower().removeprefix("www.")
+
+
+class ImageIndex:
+    """
+    Tables :
+    - hashes   : url -> empreinte (hex, None = pas une image lisible)
+    - known    : empreinte, kind ("logo", "avatar", "placeholder"), site ("" = tous les sites)
+    - sightings: (site, article) -> empreinte de son image d'en-tête, pour repérer les images génériques
+    """
+
+    def __init__(self, path: Path = INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                url TEXT PRIMARY KEY,
+                hash TEXT,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS known (
+                hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                site TEXT NOT NULL,
+                PRIMARY KEY (hash, kind, site)
+            );
+            CREATE TABLE IF NOT EXISTS sightings (
+                site TEXT NOT NULL,
+                content_url TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (site, content_url)
+            );
+            CREATE INDEX IF NOT EXISTS sightings_hash ON sightings (site, hash);
+        """)
+        self._db.commit()
+        # bandes en mémoire : (n° de bande, valeur) -> {(empreinte, kind, site)}
+        self._buckets: dict[tuple[int, int], set] = {}
+        for h, kind, site in self._db.execute("SELECT hash, kind, site FROM known"):
+            if informative(int(h, 16)):      # entrées enregistrées avant le filtre des images unies
+                self._add_bucket(int(h, 16), kind, site)
+
+    def _add_bucket(self, h: int, kind: str, site: str):
+        for band in _bands(h):
+            self._buckets.setdefault(band, set()).add((h, kind, site))
+
+    def cached_hash(self, url: str):
+        """(trouvé, empreinte) : trouvé=False si l'URL n'a pas été hachée récemment."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT hash FROM hashes WHERE url = ? AND fetched_at > ?", (url, time.time() - HASH_TTL)
+            ).fetchone()
+        if row is None:
+            return False, None
+        h = int(row[0], 16) if row[0] else None
+        return True, (h if h is not None and informative(h) else None)
+
+    def store_hash(self, url: str, h: int | None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO hashes (url, hash, fetched_at) VALUES (?, ?, ?)",
+                (url, f"{h:016x}" if h is not None else None, time.time()),
+            )
+            self._db.commit()
+
+    def add(self, h: int, kind: str, site: str = ""):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO known (hash, kind, site) VALUES (?, ?, ?)", (f"{h:016x}", kind, site))
+            self._db.commit()
+            self._add_bucket(h, kind, site)
+
+    def match(self, h: int, site: str = "") -> str | None:
+        """kind de l'image connue la plus proche de `h` (à HASH_DISTANCE bits près), None sinon."""
+        best = None
+        with self._lock:
+            for band in _bands(h):
+                for known, kind, known_site in self._buckets.get(band, ()):
+                    if known_site and known_site != site:
+                        continue
+                    d = (known ^ h).bit_count()
+                    if d <= HASH_DISTANCE and (best is None or d < best[0]):
+                        best = (d, kind)
+        return best[1] if best else None
+
+    def sighting(self, site: str, content_url: str, h: int) -> int:
+        """Note l'image d'en-tête d'un article ; renvoie le nombre d'articles du site qui ont la même."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sightings (site, content_url, hash) VALUES (?, ?, ?)",
+                (site, content_url, f"{h:016x}"),
+            )
+            self._db.commit()
+            (n,) = self._db.execute(
+                "SELECT COUNT(*) FROM sightings WHERE site = ? AND hash = ?", (site, f"{h:016x}")
+            ).fetchone()
+        return n
+
+
+_INDEX: ImageIndex | None = None
+_INDEX_LOCK = threading.Lock()
+_MEMO: dict[str, int | None] = {}      # empreintes déjà calculées pendant ce run
+
+
+def get_index() -> ImageIndex:
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = ImageIndex()
+    return _INDEX
+
+
+def fingerprint(url: str | None) -> int | None:
+    """
+    Empreinte de l'image `url` (vignette hero téléchargée une seule fois),
+    None si ce n'est pas une image lisible, si elle est unie ou si le téléchargement a échoué.
+    """
+    if not url or not str(url).startswith(("http://", "https://")):
+        return None
+    if url in _MEMO:
+        return _MEMO[url]
+    found, h = get_index().cached_hash(url)
+    if not found:
+        try:
+            hero = thumbnails.ensure(url, ["hero"], raise_errors=True)["hero"]
+        except requests.RequestException as e:
+            print(f"[image_index] {url} : {e}")
+            _MEMO[url] = None    # erreur réseau : pas retentée pendant ce run, rien en cache SQLite
+            return None
+        h = None
+        if hero is not None:
+            try:
+                with Image.open(hero) as img:
+                    h = dhash(img)
+            except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+                h = None
+        get_index().store_hash(url, h)
+    _MEMO[url] = h
+    return h
+
+
+def remember(url: str | None, kind: str):
+    """Enregistre une image connue ("logo", "avatar") : elle ne sera plus prise comme image d'en-tête."""
+    h = fingerprint(url)
+    if h is not None:
+        get_index().add(h, kind)
+
+
+def reused_image(img_url: str | None, content_url: str | None) -> str | None:
+    """
+    Image d'en-tête candidate `img_url` pour l'article `content_url` :
+    "logo", "avatar" ou "placeholder" si c'est une image connue, None si elle peut servir.
+    """
+    h = fingerprint(img_url)
+    if h is None:
+        return None
+    site = _site(content_url)
+    index = get_index()
+    kind = index.match(h, site)
+    if kind is None and content_url and index.sighting(site, content_url, h) >= PLACEHOLDER_MIN_PAGES:
+        index.add(h, "placeholder", site)
+        kind = "placeholder"
+    return kind
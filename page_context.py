@@ -0,0 +1,143 @@
+# page_context.py
+"""
+Contexte de page d'une entrée RSS.
+La page de l'article est téléchargée et parsée au plus une fois, et seulement
+si un extracteur (date, description, image, titre) en a réellement besoin.
+Deux niveaux de lecture :
+- .head : on arrête le téléchargement dès </head> (og:*, meta, <title>, JSON-LD)
+- .soup / .text : page complète (plafonnée à MAX_HTML_BYTES), pour les <p>, <img>, <h1>
+Les liens qui ne sont pas des pages HTML sont reconnus avant de lire le corps (.kind) :
+- PDF : seuls les premiers octets sont lus (Range), titre/date/sujet dans .pdf_meta
+- audio / vidéo / archives : jamais téléchargés
+"""
+import threading
+import time
+
+import requests
+from bs4 import BeautifulSoup
+
+import http_client
+from pdf_meta import parse_pdf_metadata
+
+
+class PageContext:
+    """
+    Page HTML partagée par les extracteurs d'une même entrée.
+    - rien n'est téléchargé tant qu'on ne lit pas .head / .html / .soup / .text
+    - .head ne lit que le début de la page ; la page complète n'est récupérée
+      que si un extracteur a besoin du <body>
+    - chaque DOM BeautifulSoup est construit une seule fois
+    - deadline (time.monotonic()) : au-delà, plus de téléchargement (error = Timeout)
+    """
+
+    def __init__(self, url: str | None, headers: dict | None = None, timeout=None, deadline: float | None = None):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.deadline = deadline
+        self.status_code: int | None = None
+        self.content_type = ""
+        self.error: Exception | None = None
+        self.kind: str | None = None     # 'html' / 'pdf' / 'media' / 'other' (None tant qu'inconnu)
+        self.pdf_meta: dict = {}
+        self._html: str | None = None
+        self._complete = False      # _html contient-il toute la page (ou tout ce qu'on en lira) ?
+        self._head_soup = None
+        self._soup = None
+        self._text: str | None = None
+        self._fetched = False
+        self._lock = threading.Lock()
+
+    # ---- téléchargement (au plus une lecture partielle + une complète) ----
+    def _fetch(self, head_only: bool):
+        with self._lock:
+            if self._complete or (head_only and self._fetched):
+                return
+            self._fetched = True
+            if not self.url or self.error is not None:
+                self._complete = True
+                return
+            headers = self.headers
+            url_kind = http_client.kind_from_url(self.url)
+            if url_kind == "media":
+                # podcast, vidéo... : rien à extraire du fichier, pas de requête
+                self.kind = "media"
+                self._complete = True
+                return
+            if url_kind == "pdf":
+                headers = {**headers, "Range": f"bytes=0-{http_client.PDF_PROBE_BYTES - 1}"}
+            timeout = self.timeout
+            if self.deadline is not None:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    self.error = requests.Timeout(f"délai de l'entrée dépassé : {self.url}")
+                    self._complete = True
+                    return
+                # la lecture ne doit pas dépasser le délai restant de l'entrée
+                read = timeout[1] if isinstance(timeout, tuple) else (timeout or http_client.READ_TIMEOUT)
+                timeout = min(read, remaining)
+            try:
+                resp = http_client.get(
+                    self.url, headers=headers, timeout=timeout,
+                    head_only=head_only, max_bytes=None if head_only else http_client.MAX_HTML_BYTES,
+                )
+                self.status_code = resp.status_code
+                self.content_type = (resp.headers.get("Content-Type") or "").lower()
+                if resp.status_code in (200, 206):
+                    self.kind = http_client.content_kind(self.content_type)
+                if self.kind in ("pdf", "media"):
+                    if self.kind == "pdf":
+                        self.pdf_meta = parse_pdf_metadata(resp.content)
+                    self._complete = True
+                elif resp.status_code == 200 and resp.text:
+                    self._html = resp.text
+                    # lecture complète plafonnée (MAX_HTML_BYTES) : c'est tout ce qu'on en lira
+                    self._complete = not head_only or not getattr(resp, "partial", False)
+                else:
+                    self._complete = True   # rien de plus à attendre de cette page
+            except requests.RequestException as e:
+                self.error = e
+                self._complete = True
+                print(f"[WARN] Impossible de télécharger {self.url} : {e}")
+
+    @property
+    def fetched(self) -> bool:
+        return self._fetched
+
+    @property
+    def html(self) -> str | None:
+        """Page complète."""
+        self._fetch(head_only=False)
+        return self._html
+
+    @property
+    def is_html(self) -> bool:
+        return bool(self.html) and "text/html" in self.content_type
+
+    @property
+    def head(self):
+        """
+        DOM du début de la page (jusqu'à </head>), ou de la page complète si elle est déjà là.
+        None si la page n'a pas pu être récupérée.
+        """
+        self._fetch(head_only=True)
+        if self._complete:
+            return self.soup
+        if self._head_soup is None and self._html:
+            self._head_soup = BeautifulSoup(self._html, "html.parser")
+        return self._head_soup
+
+    @property
+    def soup(self):
+        """DOM de la page complète (None si la page n'a pas pu être récupérée)."""
+        if self._soup is None and self.html:
+            self._soup = BeautifulSoup(self._html, "html.parser")
+        return self._soup
+
+    @property
+    def text(self) -> str:
+        """Texte brut de la page, calculé une fois."""
+        if self._text is None:
+            soup = self.soup
+            self._text = soup.get_text(separator=" ", strip=True) if soup is not None else ""
+        return self._text
@@ -1,20 +1,45 @@
 import os
 import re
 import json
+import atexit
+import sqlite3
+import threading
+import time
 import requests
+import http_client
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, time as dtime, timedelta, timezone
 from pathlib import Path
-from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+from page_context import PageContext
+from urllib.parse import urljoin, urlparse
 from typing import Optional, Dict, List, Tuple
 
 # =========================
 # Réglages
 # =========================
-_TIMEOUT = 7
 _HEADERS = {"User-Agent": "AgregateurDeContenu/1.0 (+contact: dev@example.com)"}
-_GOOGLE_API = "https://www.googleapis.com/customsearch/v1"
-_DEFAULT_CACHE_PATH = Path(os.getenv("LOGO_CACHE_PATH", str(Path.home() / ".cache" / "agregateur_logo_cache.json")))
-
-_MEMO: Dict[str, str] = {}
+_GOOGLE_API = os.getenv("GOOGLE_CSE_ENDPOINT", "https://www.googleapis.com/customsearch/v1")   # ou serveur bouchon (tests)
+_CSE_DAILY_QUOTA = int(os.getenv("GOOGLE_CSE_DAILY_QUOTA", "100"))   # requêtes / jour (offre gratuite : 100)
+_CSE_NEW_SITES_SHARE = 0.2   # part du quota que les rafraîchissements (force_refresh) laissent aux nouveaux sites
+# le quota Google repart de zéro à minuit, heure du Pacifique
+try:
+    _CSE_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:   # pas de base des fuseaux (Windows sans tzdata)
+    _CSE_TZ = timezone(timedelta(hours=-8))
+_APP_DB_PATH = Path(__file__).parent / "mydb.db"    # base de l'application (voir aggcon_v2.db_file)
+_DEFAULT_CACHE_PATH = Path(os.getenv("LOGO_CACHE_DB", str(Path.home() / ".cache" / "agregateur_logos" / "logos.sqlite")))
+# ancien cache JSON : importé une fois dans la base SQLite puis renommé en .migrated
+_LEGACY_JSON_PATH = Path(os.getenv("LOGO_CACHE_PATH", str(Path.home() / ".cache" / "agregateur_logo_cache.json")))
+_FLUSH_EVERY = 20      # logos gardés en mémoire avant écriture groupée
+_CSE_WORKERS = 3       # requêtes Google CSE simultanées pour un même logo
+_GOOD_ENOUGH = 95      # score à partir duquel on arrête de chercher
+_SITE_LOGO_MIN_SCORE = 60      # logo déclaré par le site retenu à partir de ce score (sinon : Google CSE)
+# simple icône (apple-touch-icon, manifest, favicon) sans "logo" ni SVG : presque toutes atteignent le score,
+# elle ne dispense de Google CSE que si sa taille déclarée (sizes) fait au moins 256 px de côté
+# (icône d'application haute définition, en général le logo du site) ; une apple-touch-icon 180 px ne suffit pas
+_SITE_ICON_MIN_SIDE = 256
+_SITE_PROBE_TTL = 30 * 24 * 3600   # site sans logo exploitable : pas de nouvel essai avant 30 jours
 
 # Domaines hors-sujet
 _BLACKLIST_HOST_PARTS = [
@@ -33,36 +58,188 @@ _NEGATIVE_URL_TOKENS = ["wallpaper", "background", "mockup", "template"]
 # =========================
 # Cache persistant
 # =========================
-def _load_disk_cache(path: Path) -> Dict[str, str]:
-    if not path.exists():
-        return {}
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+class LogoCache:
+    """
+    Logos déjà trouvés (préfixe du site -> URL du logo), table SQLite (WAL : plusieurs process possibles).
+    Chargée une seule fois en mémoire ; les nouveaux logos sont écrits par lots de _FLUSH_EVERY
+    (et à la fin du process).
+    """
+
+    def __init__(self, path: Path, legacy_json: Optional[Path] = None):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS logos (
+                prefix TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS site_probes (
+                prefix TEXT PRIMARY KEY,
+                checked_at REAL NOT NULL
+            )""")
+        self._db.commit()
+        if legacy_json is not None and legacy_json.exists():
+            self._migrate(legacy_json)
+        self._memo: Dict[str, str] = dict(self._db.execute("SELECT prefix, url FROM logos"))
+        self._pending: Dict[str, str] = {}
+
+    def _migrate(self, legacy_json: Path):
+        try:
+            with legacy_json.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR IGNORE INTO logos (prefix, url, updated_at) VALUES (?, ?, ?)",
+            [(prefix, url, now) for prefix, url in data.items() if isinstance(url, str)],
+        )
+        self._db.commit()
+        os.replace(legacy_json, legacy_json.with_name(legacy_json.name + ".migrated"))
+
+    def get(self, prefix: str) -> Optional[str]:
+        with self._lock:
+            return self._memo.get(prefix)
+
+    def set(self, prefix: str, url: str):
+        with self._lock:
+            self._memo[prefix] = url
+            self._pending[prefix] = url
+            if len(self._pending) >= _FLUSH_EVERY:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    # ---- sites dont la page d'accueil n'a pas donné de logo ----
+    def site_probed_recently(self, prefix: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM site_probes WHERE prefix=? AND checked_at > ?", (prefix, time.time() - _SITE_PROBE_TTL)
+            ).fetchone()
+        return row is not None
+
+    def record_site_probe(self, prefix: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO site_probes (prefix, checked_at) VALUES (?, ?)", (prefix, time.time()))
+            self._db.commit()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO logos (prefix, url, updated_at) VALUES (?, ?, ?)",
+            [(prefix, url, now) for prefix, url in self._pending.items()],
+        )
+        self._db.commit()
+        self._pending.clear()
+
+
+class CseQuota:
+    """
+    Requêtes Google CSE du jour, table cse_usage de la base de l'application (mydb.db, à côté de
+    sources_state) : le compteur suit la base d'un run à l'autre et entre process qui la partagent.
+    """
+
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cse_usage (
+                day TEXT PRIMARY KEY,
+                calls INTEGER NOT NULL
+            )""")
+        self._db.commit()
+
+    def calls(self, day: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT calls FROM cse_usage WHERE day=?", (day,)).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, day: str, limit: float) -> bool:
+        """Compte une requête si le compteur du jour est sous `limit` (UPDATE conditionnel)."""
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO cse_usage (day, calls) VALUES (?, 0)", (day,))
+            n = self._db.execute(
+                "UPDATE cse_usage SET calls = calls + 1 WHERE day=? AND calls < ?", (day, limit)
+            ).rowcount
+            self._db.execute("DELETE FROM cse_usage WHERE day < ?", ((datetime.now() - timedelta(days=30)).date().isoformat(),))
+            self._db.commit()
+        return n == 1
+
+    def refund(self, day: str):
+        with self._lock:
+            self._db.execute("UPDATE cse_usage SET calls = MAX(calls - 1, 0) WHERE day=?", (day,))
+            self._db.commit()
+
+    def exhaust(self, day: str, quota: int):
+        with self._lock:
+            self._db.execute("UPDATE cse_usage SET calls = MAX(calls, ?) WHERE day=?", (quota, day))
+            self._db.commit()
+
+
+_STORES: Dict[Path, LogoCache] = {}
+_STORES_LOCK = threading.Lock()
+
+def _store(cache_path: Path) -> LogoCache:
+    with _STORES_LOCK:
+        store = _STORES.get(Path(cache_path))
+        if store is None:
+            legacy = _LEGACY_JSON_PATH if Path(cache_path) == _DEFAULT_CACHE_PATH else None
+            store = _STORES[Path(cache_path)] = LogoCache(cache_path, legacy)
+        return store
+
+_CSE_QUOTA: Optional[CseQuota] = None
+
+def _cse_quota() -> CseQuota:
+    global _CSE_QUOTA
+    with _STORES_LOCK:
+        if _CSE_QUOTA is None:
+            _CSE_QUOTA = CseQuota(_APP_DB_PATH)
+        return _CSE_QUOTA
+
+@atexit.register
+def flush_logo_cache():
+    """Écrit les logos encore en mémoire (appelé automatiquement à la fin du process)."""
+    for store in list(_STORES.values()):
+        store.flush()
+
+# un seul calcul à la fois par site : les autres threads attendent puis lisent le cache
+_PREFIX_LOCKS: Dict[str, threading.Lock] = {}
+
+def _prefix_lock(prefix: str) -> threading.Lock:
+    with _STORES_LOCK:
+        return _PREFIX_LOCKS.setdefault(prefix, threading.Lock())
+
+# =========================
+# Quota Google CSE
+# =========================
+class CseQuotaExhausted(Exception):
+    """Quota Google CSE du jour épuisé : la recherche est à refaire après la remise à zéro."""
 
-def _save_disk_cache(path: Path, data: Dict[str, str]):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    os.replace(tmp, path)
+def _cse_day() -> str:
+    return datetime.now(_CSE_TZ).date().isoformat()
+
+def cse_calls_left() -> int:
+    return max(0, _CSE_DAILY_QUOTA - _cse_quota().calls(_cse_day()))
+
+def cse_quota_resets_at() -> datetime:
+    """Prochaine remise à zéro du quota, en UTC sans fuseau (comme les dates de la base)."""
+    tomorrow = datetime.now(_CSE_TZ).date() + timedelta(days=1)
+    return datetime.combine(tomorrow, dtime(), tzinfo=_CSE_TZ).astimezone(timezone.utc).replace(tzinfo=None)
 
 def _get_cached(prefix: str, cache_path: Path) -> Optional[str]:
-    if prefix in _MEMO:
-        return _MEMO[prefix]
-    disk = _load_disk_cache(cache_path)
-    if prefix in disk:
-        _MEMO[prefix] = disk[prefix]
-        return disk[prefix]
-    return None
+    return _store(cache_path).get(prefix)
 
 def _set_cached(prefix: str, url: str, cache_path: Path):
-    _MEMO[prefix] = url
-    disk = _load_disk_cache(cache_path)
-    disk[prefix] = url
-    _save_disk_cache(cache_path, disk)
+    _store(cache_path).set(prefix, url)
 
 # =========================
 # Utils domaine / URL
@@ -114,6 +291,17 @@ def _pick_reference_url(entry: Optional[dict], base_link: Optional[str]) -> Opti
         return base_link
     return None
 
+def logo_prefix(entry: Optional[dict], base_link: Optional[str]) -> Optional[str]:
+    """Site dont on cherche le logo ('https://domaine/'), clé du cache."""
+    ref = _pick_reference_url(entry, base_link)
+    return _prefix_from_url(ref) if ref else None
+
+def cached_logo_institution(entry: Optional[dict], base_link: Optional[str],
+                            cache_path: Path = _DEFAULT_CACHE_PATH) -> Optional[str]:
+    """Logo déjà connu pour le site de l'entrée (sans aucune requête), None sinon."""
+    prefix = logo_prefix(entry, base_link)
+    return _get_cached(prefix, cache_path) if prefix else None
+
 def _build_queries(prefix_url: str, entry: Optional[dict]) -> List[Tuple[str,str]]:
     p = urlparse(prefix_url)
     host = _norm_host(p.netloc or "")
@@ -150,7 +338,16 @@ def _build_queries(prefix_url: str, entry: Optional[dict]) -> List[Tuple[str,str
     return deduped
 
 def _google_image_search(query: str, api_key: str, cx: str,
-                         filetype: Optional[str]=None, num: int=10) -> List[dict]:
+                         filetype: Optional[str]=None, num: int=10, refresh: bool=False) -> Optional[List[dict]]:
+    """
+    Une requête CSE, décomptée du quota du jour. None si elle a échoué.
+    Quota épuisé → CseQuotaExhausted, sans rien envoyer ; refresh=True (logo déjà connu) :
+    on laisse _CSE_NEW_SITES_SHARE du quota aux sites jamais résolus.
+    """
+    quota, day = _cse_quota(), _cse_day()
+    limit = _CSE_DAILY_QUOTA * (1 - _CSE_NEW_SITES_SHARE) if refresh else _CSE_DAILY_QUOTA
+    if not quota.reserve(day, limit):
+        raise CseQuotaExhausted(f"quota Google CSE du {day} épuisé")
     params = {
         "key": api_key, "cx": cx, "q": query,
         "searchType": "image", "num": str(num), "safe": "off", "hl": "fr", "gl": "fr"
@@ -159,12 +356,146 @@ def _google_image_search(query: str, api_key: str, cx: str,
         params["fileType"] = filetype
         params["hq"] = f"filetype:{filetype}"
     try:
-        r = requests.get(_GOOGLE_API, headers=_HEADERS, params=params, timeout=_TIMEOUT)
-        if not r.ok:
-            return []
-        return r.json().get("items", []) or []
+        # pas de nouvelle tentative sur 429/503 : chaque requête envoyée est facturée, une par unité réservée
+        r = http_client.get(_GOOGLE_API, headers=_HEADERS, params=params, retry_throttled=False)
     except Exception:
+        # erreur réseau, disjoncteur ouvert, URL en échec récent (HostUnavailable) : rien de facturé
+        quota.refund(day)
+        return None
+    if getattr(r, "from_cache", False):
+        quota.refund(day)     # servie par le cache HTTP : rien de facturé
+    if r.status_code == 429:
+        # quota épuisé côté Google (autre clé, autre machine...) : on s'aligne
+        quota.exhaust(day, _CSE_DAILY_QUOTA)
+        raise CseQuotaExhausted(f"quota Google CSE du {day} épuisé (429)")
+    if not r.ok:
+        return None
+    try:
+        return r.json().get("items", []) or []
+    except ValueError:
+        return None
+
+# =========================
+# Logo déclaré par le site lui-même
+# =========================
+def _parse_sizes(sizes: Optional[str]) -> Tuple[int, int]:
+    """'180x180' / '16x16 32x32' -> plus grande taille ; 'any' (SVG) -> (0, 0)."""
+    best = (0, 0)
+    for m in re.finditer(r"(\d+)x(\d+)", sizes or "", re.IGNORECASE):
+        w, h = int(m.group(1)), int(m.group(2))
+        if w * h > best[0] * best[1]:
+            best = (w, h)
+    return best
+
+def _candidate(link: str, kind: str, home: str, w: int = 0, h: int = 0) -> dict:
+    # même forme qu'un résultat Google CSE, pour _score_candidate
+    return {"link": link, "title": kind, "image": {"width": w, "height": h, "contextLink": home}}
+
+def _jsonld_logos(soup, home: str) -> List[dict]:
+    out = []
+    for tag in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(tag.string or tag.get_text() or "")
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if not isinstance(node, dict):
+                continue
+            stack.extend(node.get("@graph") or [])
+            stack.append(node.get("publisher"))
+            types = node.get("@type")
+            types = types if isinstance(types, list) else [types]
+            logo = node.get("logo")
+            if logo and any(t in ("Organization", "NewsMediaOrganization", "GovernmentOrganization",
+                                  "EducationalOrganization", "NGO", "Corporation") for t in types):
+                if isinstance(logo, dict):
+                    url, w, h = logo.get("url") or logo.get("contentUrl"), logo.get("width"), logo.get("height")
+                else:
+                    url, w, h = logo, 0, 0
+                if isinstance(url, str) and url.strip():
+                    try:
+                        w, h = int(w or 0), int(h or 0)
+                    except (TypeError, ValueError):
+                        w, h = 0, 0
+                    out.append(_candidate(urljoin(home, url.strip()), "logo organization (json-ld)", home, w, h))
+    return out
+
+def _manifest_icons(soup, home: str) -> List[dict]:
+    tag = soup.find("link", rel=lambda v: v and "manifest" in [r.lower() for r in (v if isinstance(v, list) else [v])])
+    if not tag or not tag.get("href"):
         return []
+    try:
+        r = http_client.get(urljoin(home, tag["href"]), headers=_HEADERS, max_bytes=200_000)
+        icons = r.json().get("icons") or [] if r.ok else []
+    except (requests.RequestException, ValueError, AttributeError):
+        return []
+    out = []
+    for icon in icons:
+        if isinstance(icon, dict) and icon.get("src"):
+            w, h = _parse_sizes(icon.get("sizes"))
+            out.append(_candidate(urljoin(r.url or home, icon["src"]), "icon (manifest)", home, w, h))
+    return out
+
+def _site_logo_candidates(prefix_url: str) -> Optional[List[dict]]:
+    """
+    Logos déclarés par le site sur sa page d'accueil (une seule requête, + le manifest s'il existe) :
+    JSON-LD Organization.logo, og:logo, apple-touch-icon, <link rel=icon sizes=...>, icônes du manifest.
+    None si la page d'accueil n'a pas pu être lue.
+    """
+    page = PageContext(prefix_url, headers=_HEADERS)
+    soup = page.head
+    if soup is None:
+        return None      # page d'accueil injoignable (erreur réseau, 5xx...) : rien n'a pu être examiné
+    home = page.url
+    out = []
+    for meta in soup.find_all("meta"):
+        if (meta.get("property") or meta.get("itemprop") or "").lower() in ("og:logo", "logo") and meta.get("content"):
+            out.append(_candidate(urljoin(home, meta["content"]), "logo (og:logo)", home))
+    for link in soup.find_all("link", href=True):
+        rel = " ".join(link.get("rel") or []).lower()
+        if "apple-touch-icon" in rel:
+            w, h = _parse_sizes(link.get("sizes")) if link.get("sizes") else (180, 180)   # taille par défaut d'iOS
+            out.append(_candidate(urljoin(home, link["href"]), "apple-touch-icon", home, w, h))
+        elif "icon" in rel.split():
+            w, h = _parse_sizes(link.get("sizes"))
+            out.append(_candidate(urljoin(home, link["href"]), "icon", home, w, h))
+    out.extend(_manifest_icons(soup, home))
+    out.extend(_jsonld_logos(soup, home))
+    if not out and page.soup is not None:
+        # rien dans le <head> : JSON-LD éventuel en fin de <body>
+        out.extend(_jsonld_logos(page.soup, home))
+    return out
+
+def _is_declared_logo(it: dict) -> bool:
+    """og:logo / JSON-LD Organization.logo, "logo" dans l'URL ou image SVG ; sinon simple icône."""
+    return ("logo" in (it.get("title") or "") or "logo" in urlparse(it["link"]).path.lower()
+            or _ext_of(it["link"]) == "svg")
+
+def _site_logo(prefix_url: str) -> Tuple[Optional[str], bool]:
+    """
+    (meilleur logo déclaré par le site, page d'accueil lue ?). Même barème que Google CSE, à partir de
+    _SITE_LOGO_MIN_SCORE ; une simple icône doit en plus déclarer au moins _SITE_ICON_MIN_SIDE px.
+    """
+    candidates = _site_logo_candidates(prefix_url)
+    if candidates is None:
+        return None, False
+    target_host = _host_of(prefix_url)
+    best: Tuple[float, Optional[str]] = (-1e9, None)
+    for it in candidates:
+        w, h = it["image"]["width"], it["image"]["height"]
+        if (w or h) and min(w, h) < 32:       # favicons 16x16 / 32x32 : trop petits
+            continue
+        if not _is_declared_logo(it) and min(w, h) < _SITE_ICON_MIN_SIDE:
+            continue
+        s = _score_candidate(it, target_host)
+        if s >= _SITE_LOGO_MIN_SCORE and s > best[0]:
+            best = (s, it["link"])
+    return best[1], True
 
 # =========================
 # Filtrage et scoring
@@ -223,6 +554,58 @@ def _score_candidate(it: dict, target_host: str) -> float:
 
     return score
 
+def _search_best(queries: List[Tuple[str,str]], api_key: str, cx: str, target_host: str,
+                 per_query: int, refresh: bool = False) -> Tuple[float, Optional[str], bool]:
+    """
+    Lance les requêtes CSE en parallèle (_CSE_WORKERS à la fois, dans l'ordre de _build_queries)
+    et garde le meilleur candidat. Dès qu'un candidat atteint _GOOD_ENOUGH, plus aucune requête
+    n'est lancée (celles en cours sont abandonnées).
+    Renvoie (score, lien, recherche_complete) ; quota épuisé sans aucun candidat → CseQuotaExhausted.
+    """
+    best: Tuple[float, Optional[str]] = (-1e9, None)
+    seen_links = set()
+    answered, quota_error = 0, None
+    todo = [q for _, q in queries]
+    ex = ThreadPoolExecutor(max_workers=max(1, min(_CSE_WORKERS, len(todo))))
+    running = set()
+    try:
+        while todo or running:
+            # fenêtre glissante : une nouvelle requête part seulement quand une autre a été évaluée
+            while todo and len(running) < _CSE_WORKERS:
+                running.add(ex.submit(_google_image_search, todo.pop(0), api_key, cx, None, per_query, refresh))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            results = []
+            for fut in done:
+                try:
+                    items = fut.result()
+                except CseQuotaExhausted as e:
+                    quota_error, todo = e, []
+                    continue
+                if items is not None:
+                    answered += 1
+                    results.extend(items)
+            for it in results:
+                link = it.get("link")
+                if not link or link in seen_links:
+                    continue
+                seen_links.add(link)
+
+                ok, w, h = _valid_image(it, 16)
+                if not ok:
+                    continue
+
+                s = _score_candidate(it, target_host)
+                if s > best[0]:
+                    best = (s, link)
+
+            if best[0] >= _GOOD_ENOUGH:
+                break
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+    if quota_error is not None and best[1] is None:
+        raise quota_error
+    return best[0], best[1], answered > 0 and quota_error is None
+
 # =========================
 # Fonction principale
 # =========================
@@ -234,20 +617,23 @@ def extract_logo_institution(
     google_api_key: Optional[str] = None,
     google_cx: Optional[str] = None,
     cache_path: Path = _DEFAULT_CACHE_PATH,
-    force_refresh: bool = True,
+    force_refresh: bool = False,
     max_queries: int = 6,
-    per_query: int = 10
+    per_query: int = 10,
+    defer_on_quota: bool = False
 ) -> str:
+    """
+    Logo du site de l'entrée, par ordre de coût :
+      1) cache
+      2) logo déclaré par le site (page d'accueil, une fois par site)
+      3) Google CSE (dans la limite du quota du jour)
+    Quota épuisé : fallback_url (non mis en cache), ou CseQuotaExhausted si defer_on_quota=True
+    (la file d'enrichissement reporte alors la tâche).
+    """
     api_key = google_api_key or os.getenv("GOOGLE_API_KEY")
     cx = google_cx or os.getenv("GOOGLE_CX")
-    if not api_key or not cx:
-        return fallback_url
-
-    ref = _pick_reference_url(entry, base_link)
-    if not ref:
-        return fallback_url
 
-    prefix = _prefix_from_url(ref)
+    prefix = logo_prefix(entry, base_link)
     if not prefix:
         return fallback_url
 
@@ -256,33 +642,35 @@ def extract_logo_institution(
         if cached:
             return cached
 
-    queries = _build_queries(prefix, entry)
-    if max_queries > 0:
-        queries = queries[:max_queries]
-
-    target_host = _host_of(prefix)
-    best: Tuple[float, Optional[str]] = (-1e9, None)
-    seen_links = set()
-
-    for cat, q in queries:
-        results = _google_image_search(q, api_key, cx, filetype=None, num=per_query)
-        for it in results:
-            link = it.get("link")
-            if not link or link in seen_links:
-                continue
-            seen_links.add(link)
-
-            ok, w, h = _valid_image(it, 16)
-            if not ok:
-                continue
-
-            s = _score_candidate(it, target_host)
-            if s > best[0]:
-                best = (s, link)
-
-        if best[0] >= 95:
-            break
-
-    chosen = best[1] or fallback_url
-    _set_cached(prefix, chosen, cache_path)
-    return chosen
+    with _prefix_lock(prefix):
+        # un autre thread a pu trouver le logo de ce site pendant qu'on attendait
+        if not force_refresh:
+            cached = _get_cached(prefix, cache_path)
+            if cached:
+                return cached
+
+        store = _store(cache_path)
+        if not store.site_probed_recently(prefix):
+            site_logo, homepage_read = _site_logo(prefix)
+            if site_logo:
+                _set_cached(prefix, site_logo, cache_path)
+                return site_logo
+            if homepage_read:      # erreur passagère : la page d'accueil sera réessayée au prochain appel
+                store.record_site_probe(prefix)
+
+        if not api_key or not cx:
+            return fallback_url
+        queries = _build_queries(prefix, entry)
+        if max_queries > 0:
+            queries = queries[:max_queries]
+
+        try:
+            _, link, complete = _search_best(queries, api_key, cx, _host_of(prefix), per_query, refresh=force_refresh)
+        except CseQuotaExhausted:
+            if defer_on_quota:
+                raise
+            return fallback_url
+        if link or complete:
+            # "pas de logo" n'est retenu que si la recherche a vraiment eu lieu
+            _set_cached(prefix, link or fallback_url, cache_path)
+        return link or fallback_url
@@ -1,28 +1,40 @@
 import re
 import requests
+import http_client
+import bsky_profiles
 from urllib.parse import urlparse, quote
 
-# ===== Bluesky: endpoint public officiel =====
-BLSKY_PROFILE_ENDPOINT = "https://public.api.bsky.app/xrpc/app.bsky.actor.getProfile"
-
+# ===== Bluesky: API publique, par lots + cache (voir bsky_profiles.py) =====
 def fetch_bluesky_avatar(username_or_did: str,
                          fallback_url: str = "https://example.com/default_avatar.png") -> str:
     """
-    Récupère l'avatar d'un utilisateur Bluesky via l'API publique:
-      GET https://public.api.bsky.app/xrpc/app.bsky.actor.getProfile?actor=<handle|did>
+    Récupère l'avatar d'un utilisateur Bluesky (app.bsky.actor.getProfiles, cache d'un jour).
     Retourne avatar ou fallback_url en cas d'échec.
     """
-    try:
-        resp = requests.get(BLSKY_PROFILE_ENDPOINT, params={"actor": username_or_did}, timeout=5)
-        if resp.ok:
-            data = resp.json() or {}
-            return data.get("avatar") or fallback_url
-        else:
-            print(f"[Bluesky] HTTP {resp.status_code} for {username_or_did}")
-            return fallback_url
-    except requests.RequestException as e:
-        print(f"[Bluesky] Error: {e}")
-        return fallback_url
+    return bsky_profiles.avatar(username_or_did) or fallback_url
+
+
+def _reference_link(entry: dict | None, base_link: str | None) -> str | None:
+    for key in ("link", "url", "id", "origin_link", "author_url"):
+        if entry and isinstance(entry.get(key), str) and entry[key].startswith(("http://", "https://")):
+            return entry[key]
+    return base_link if isinstance(base_link, str) else None
+
+
+def bluesky_actor(entry: dict | None, base_link: str | None) -> str | None:
+    """Handle ou DID Bluesky de l'auteur de l'entrée (None si ce n'est pas un post Bluesky)."""
+    link = _reference_link(entry, base_link)
+    if link and "bsky.app" in (urlparse(link).netloc or "").lower():
+        #   https://bsky.app/profile/<handle|did>/...
+        m = re.search(r"bsky\.app/profile/([^/?#]+)", link, re.IGNORECASE)
+        if m:
+            return m.group(1)
+    if entry:
+        for key in ("author_handle", "bsky_handle", "bsky_did"):
+            v = entry.get(key)
+            if isinstance(v, str) and v.strip():
+                return v.strip()
+    return None
 
 
 # ===== Mastodon: lookup public de l’instance =====
@@ -37,7 +49,7 @@ def fetch_mastodon_avatar(acct: str,
     user, instance = acct.split("@", 1)
     api = f"https://{instance}/api/v1/accounts/lookup"
     try:
-        resp = requests.get(api, params={"acct": acct}, timeout=5)
+        resp = http_client.get(api, params={"acct": acct})
         if resp.ok:
             data = resp.json() or {}
             return data.get("avatar") or data.get("avatar_static") or fallback_url
@@ -66,13 +78,7 @@ def extract_profile_image(entry: dict | None, base_link: str | None,
                 return url.strip()
 
     # 2) Choisir le lien de référence
-    link = None
-    for key in ("link", "url", "id", "origin_link", "author_url"):
-        if entry and isinstance(entry.get(key), str) and entry[key].startswith(("http://", "https://")):
-            link = entry[key]
-            break
-    if not link and isinstance(base_link, str):
-        link = base_link
+    link = _reference_link(entry, base_link)
     if not isinstance(link, str):
         return None
 
@@ -80,17 +86,9 @@ def extract_profile_image(entry: dict | None, base_link: str | None,
     host = (parsed.netloc or "").lower()
 
     # ===== Bluesky =====
-    #   https://bsky.app/profile/<handle|did>/...
-    if "bsky.app" in host:
-        m = re.search(r"bsky\.app/profile/([^/?#]+)", link, re.IGNORECASE)
-        if m:
-            handle_or_did = m.group(1)
-            return fetch_bluesky_avatar(handle_or_did, fallback_url)
-    if entry:
-        for key in ("author_handle", "bsky_handle", "bsky_did"):
-            v = entry.get(key)
-            if isinstance(v, str) and v.strip():
-                return fetch_bluesky_avatar(v.strip(), fallback_url)
+    actor = bluesky_actor(entry, base_link)
+    if actor:
+        return fetch_bluesky_avatar(actor, fallback_url)
 
     # ===== Mastodon =====
     mastodon_match = re.search(r"https?://([^/]+)/@([^/?#]+)", link, re.IGNORECASE)
@@ -118,4 +116,5 @@ def extract_profile_image(entry: dict | None, base_link: str | None,
     return fallback_url
 
 
-print(extract_profile_image(entry=None, base_link="https://bsky.app/profile/thomaspiketty.bsky.social/post/3lp75rtetzk2i"))
\ No newline at end of file
+if __name__ == "__main__":
+    print(extract_profile_image(entry=None, base_link="https://bsky.app/profile/thomaspiketty.bsky.social/post/3lp75rtetzk2i"))
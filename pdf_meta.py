@@ -0,0 +1,123 @@
+# pdf_meta.py
+"""
+Métadonnées d'un PDF lues dans ses premiers octets (sans télécharger le fichier complet) :
+- dictionnaire Info : /Title, /Subject, /CreationDate, /ModDate
+- paquet XMP : dc:title, dc:description, xmp:CreateDate, xmp:ModifyDate
+Les PDF "linéarisés" (cas courant des rapports publiés en ligne) ont ces infos au début du fichier ;
+sinon on renvoie simplement ce qu'on a trouvé.
+"""
+import re
+from datetime import datetime
+
+from dateutil import parser
+
+_INFO_STR_RE = {
+    key: re.compile(rb"/" + key.encode() + rb"\s*(\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>)", re.S)
+    for key in ("Title", "Subject", "CreationDate", "ModDate")
+}
+_PDF_DATE_RE = re.compile(r"D?:?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?")
+
+_XMP_RE = re.compile(rb"<x:xmpmeta.*?</x:xmpmeta>", re.S)
+_XMP_ALT_RE = {
+    key: re.compile(r"<dc:" + key + r">.*?<rdf:li[^>]*>(.*?)</rdf:li>", re.S)
+    for key in ("title", "description")
+}
+_XMP_DATE_RE = {
+    key: re.compile(r"xmp:" + key + r"(?:>|\s*=\s*\")([^<\"]+)")
+    for key in ("CreateDate", "ModifyDate")
+}
+
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f",
+            b"(": b"(", b")": b")", b"\\": b"\\"}
+
+
+def _decode_pdf_string(raw: bytes) -> str:
+    """Chaîne littérale (...) ou hexadécimale <...> -> str (UTF-16BE si BOM, sinon latin-1)."""
+    if raw.startswith(b"<"):
+        hexa = re.sub(rb"\s", b"", raw[1:-1])
+        if len(hexa) % 2:
+            hexa += b"0"
+        data = bytes.fromhex(hexa.decode("ascii"))
+    else:
+        body, data, i = raw[1:-1], bytearray(), 0
+        while i < len(body):
+            c = body[i:i + 1]
+            if c == b"\\" and i + 1 < len(body):
+                nxt = body[i + 1:i + 2]
+                octal = re.match(rb"[0-7]{1,3}", body[i + 1:i + 4])
+                if octal:
+                    data.append(int(octal.group(0), 8) & 0xFF)
+                    i += 1 + len(octal.group(0))
+                    continue
+                data += _ESCAPES.get(nxt, nxt)
+                i += 2
+                continue
+            data += c
+            i += 1
+        data = bytes(data)
+    if data.startswith(b"\xfe\xff"):
+        return data[2:].decode("utf-16-be", errors="ignore").strip()
+    return data.decode("latin-1").strip()
+
+
+def _pdf_date(value: str) -> datetime | None:
+    """'D:20250102030405+01'00'' -> datetime (partie date/heure seulement)."""
+    m = _PDF_DATE_RE.match(value.strip())
+    if not m:
+        return None
+    y, mth, d, h, mi, s = (int(g) if g else dflt for g, dflt in zip(m.groups(), (0, 1, 1, 0, 0, 0)))
+    try:
+        return datetime(y, mth, d, h, mi, s)
+    except ValueError:
+        return None
+
+
+def _xmp_text(value: str) -> str:
+    value = re.sub(r"<[^>]+>", "", value)
+    return (value.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"')
+            .replace("&apos;", "'").replace("&amp;", "&").strip())
+
+
+def parse_pdf_metadata(data: bytes) -> dict:
+    """
+    Renvoie {"title", "description", "published"} (clés absentes si non trouvées).
+    `data` : début du fichier PDF.
+    """
+    out = {}
+    if not data or not data.lstrip()[:5].startswith(b"%PDF"):
+        return out
+
+    # 1) XMP (souvent plus propre : UTF-8, dates ISO)
+    m = _XMP_RE.search(data)
+    if m:
+        xmp = m.group(0).decode("utf-8", errors="ignore")
+        for key, out_key in (("title", "title"), ("description", "description")):
+            mm = _XMP_ALT_RE[key].search(xmp)
+            if mm and _xmp_text(mm.group(1)):
+                out[out_key] = _xmp_text(mm.group(1))
+        for key in ("CreateDate", "ModifyDate"):
+            mm = _XMP_DATE_RE[key].search(xmp)
+            if mm:
+                try:
+                    out["published"] = parser.parse(mm.group(1)).replace(tzinfo=None)
+                    break
+                except (ValueError, OverflowError):
+                    pass
+
+    # 2) Dictionnaire Info (complète ce que le XMP n'a pas donné)
+    for key, out_key in (("Title", "title"), ("Subject", "description")):
+        if out_key not in out:
+            mm = _INFO_STR_RE[key].search(data)
+            if mm:
+                text = _decode_pdf_string(mm.group(1))
+                if text:
+                    out[out_key] = text
+    if "published" not in out:
+        for key in ("CreationDate", "ModDate"):
+            mm = _INFO_STR_RE[key].search(data)
+            if mm:
+                dt = _pdf_date(_decode_pdf_string(mm.group(1)))
+                if dt:
+                    out["published"] = dt
+                    break
+    return out
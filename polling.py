@@ -0,0 +1,141 @@
+# polling.py
+"""
+Planification adaptative des sources.
+Le rythme de publication de chaque source est estimé à partir de l'historique
+(published_at dans contents) ; on en déduit :
+- la prochaine échéance de la source (next_due_at) : une source trimestrielle n'est plus
+  interrogée à chaque run, un fil d'actualité l'est toujours
+- le nombre d'entrées à lire (max_posts) selon le nombre de nouveautés attendues
+- l'ordre de passage (sources prioritaires, catégorie, ancienneté du dernier passage),
+  pour que ce soient les moins importantes qui sautent si le budget du run est épuisé
+"""
+from datetime import datetime, timedelta
+import math
+from sqlalchemy import func
+
+# ---- paramètres ----
+RATE_WINDOW_DAYS = 60      # historique utilisé pour estimer le rythme
+MIN_SPAN_DAYS = 7          # évite qu'un seul contenu récent fasse exploser le rythme estimé
+TARGET_NEW_ITEMS = 1.0     # on repasse quand ~1 nouveau contenu est attendu
+MAX_INTERVAL_DAYS = 14     # même une source muette est revue au moins toutes les 2 semaines
+NEW_SOURCE_INTERVAL = timedelta(days=1)   # source sans historique daté : rythme inconnu, on repasse vite
+DUE_SLACK = timedelta(hours=3)   # le cron quotidien ne tombe pas pile 24 h après le précédent
+
+MIN_POSTS = 2              # ancienne valeur fixe du worker
+MAX_POSTS = 10
+POSTS_MARGIN = 1.5         # marge sur le nombre de nouveautés attendues
+
+# ordre de passage par catégorie (plus petit = plus tôt) : l'actualité vieillit vite, les rapports non
+CATEGORY_PRIORITY = {
+    "presse": 0, "card_tweet": 0,
+    "video": 1, "podcast_audio": 1, "dataviz": 1,
+    "rapport": 2, "académique": 2, "forum": 2, "expo_live": 2,
+}
+DEFAULT_CATEGORY_PRIORITY = 1
+
+
+def get_publication_rates(session, ContentModel, days=RATE_WINDOW_DAYS, source=None):
+    """Contenus publiés par jour, par source (ou pour la seule `source`), sur les N derniers jours."""
+    now = datetime.utcnow()
+    since = now - timedelta(days=days)
+    query = (
+        session.query(ContentModel.source, func.count(ContentModel.id), func.min(ContentModel.published_at))
+        .filter(ContentModel.published_at >= since)
+    )
+    if source is not None:
+        query = query.filter(ContentModel.source == source)
+    rows = query.group_by(ContentModel.source).all()
+    rates = {}
+    for src, n, first in rows:
+        # source récente : on rapporte au temps écoulé depuis son 1er contenu, pas à toute la fenêtre
+        span = days
+        if isinstance(first, datetime):
+            span = min(days, max(MIN_SPAN_DAYS, (now - first.replace(tzinfo=None)).days))
+        rates[src] = n / span
+    return rates
+
+
+def get_source_rate(session, ContentModel, source, days=RATE_WINDOW_DAYS):
+    """
+    Rythme d'une source recalculé juste après son passage (ses nouveaux contenus compris).
+    None si elle n'a encore aucun contenu daté : rythme inconnu, pas nul.
+    """
+    rate = get_publication_rates(session, ContentModel, days, source=source).get(source)
+    if rate is not None:
+        return rate
+    dated = (
+        session.query(ContentModel.id)
+        .filter(ContentModel.source == source, ContentModel.published_at.isnot(None))
+        .first()
+    )
+    return 0.0 if dated is not None else None
+
+
+def poll_interval(rate_per_day: float) -> timedelta:
+    """Délai jusqu'au prochain passage : le temps d'attendre TARGET_NEW_ITEMS nouveautés."""
+    if rate_per_day <= 0:
+        return timedelta(days=MAX_INTERVAL_DAYS)
+    return timedelta(days=min(MAX_INTERVAL_DAYS, TARGET_NEW_ITEMS / rate_per_day))
+
+
+def adaptive_max_posts(rate_per_day: float, last_fetched_at=None, now=None) -> int:
+    """Nombre d'entrées à lire : nouveautés attendues depuis le dernier passage (+ marge), bornées."""
+    now = now or datetime.utcnow()
+    elapsed_days = 1.0
+    if isinstance(last_fetched_at, datetime):
+        elapsed_days = max(elapsed_days, (now - last_fetched_at).total_seconds() / 86400)
+    expected = rate_per_day * elapsed_days * POSTS_MARGIN
+    return int(min(MAX_POSTS, max(MIN_POSTS, math.ceil(expected))))
+
+
+def is_due(source_state: dict | None, now=None) -> bool:
+    next_due = (source_state or {}).get("next_due_at")
+    if not isinstance(next_due, datetime):
+        return True   # source jamais planifiée
+    return next_due <= (now or datetime.utcnow()) + DUE_SLACK
+
+
+def plan_run(sources, state: dict, rates: dict, force: bool = False, now=None):
+    """
+    Sources à interroger ce run, avec leur max_posts : [(src, max_posts), ...].
+    force=True : toutes les sources (balayage complet), max_posts toujours adaptatif.
+    """
+    now = now or datetime.utcnow()
+    plan = []
+    for src in sources:
+        st = state.get(src["url"]) or {}
+        if force or is_due(st, now):
+            plan.append((src, adaptive_max_posts(rates.get(src["name"], 0.0), st.get("last_fetched_at"), now)))
+    return plan
+
+
+def order_by_priority(plan, state: dict, priority_sources=frozenset()):
+    """
+    Trie le plan [(src, max_posts), ...] : sources prioritaires, puis catégorie,
+    puis la source restée le plus longtemps sans passage.
+    """
+    def key(pair):
+        src = pair[0]
+        last = (state.get(src["url"]) or {}).get("last_fetched_at")
+        return (
+            src["name"] not in priority_sources,
+            CATEGORY_PRIORITY.get(src.get("category"), DEFAULT_CATEGORY_PRIORITY),
+            last if isinstance(last, datetime) else datetime.min,
+        )
+    return sorted(plan, key=key)
+
+
+def schedule_next(state: dict, src: dict, rates: dict, now=None):
+    """
+    Après le passage sur une source : enregistre son rythme et sa prochaine échéance dans `state`.
+    `rates` doit tenir compte des contenus que ce passage vient d'enregistrer (get_source_rate) ;
+    rythme None (source sans historique) : NEW_SOURCE_INTERVAL plutôt que l'intervalle maximal.
+    Un flux qui n'a pas répondu (erreur réseau, 5xx...) reste dû au prochain run.
+    """
+    st = state.get(src["url"])
+    if not st or st.get("last_status") not in (200, 304):
+        return
+    now = now or datetime.utcnow()
+    rate = rates.get(src["name"])
+    st["rate_per_day"] = rate
+    st["next_due_at"] = now + (poll_interval(rate) if rate is not None else NEW_SOURCE_INTERVAL)
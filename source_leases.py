@@ -0,0 +1,101 @@
+# source_leases.py
+"""
+Répartition des sources entre plusieurs workers qui partagent la même base.
+Limite : les baux sont des lignes du fichier SQLite mydb.db, ils ne coordonnent que des process qui
+ouvrent ce même fichier (plusieurs workers sur une machine, ou un disque partagé). Des jobs CI en
+matrice ou des machines distinctes travaillent chacun sur leur copie du dépôt : ils ne voient pas les
+baux des autres et leurs commits de mydb.db entrent en conflit. Pour eux, seul --shard répartit les
+sources, et il faudrait une base partagée (serveur, voir aggcon_v2) pour qu'ils coordonnent leur état.
+- bail par source (table source_leases) : seul le worker qui détient le bail interroge la source ;
+  un bail expiré (worker tué en plein run) est repris par le suivant
+- en prenant le bail, l'état de la source est relu en base : si un autre worker vient de l'interroger
+  (runs qui se chevauchent), elle n'est plus due et on passe à la suivante
+- shard i/N : le worker ne regarde qu'une part fixe des sources (hachage de l'URL), ce qui évite
+  que tous se disputent les mêmes baux ; sans shard, chaque worker prend la prochaine source due
+"""
+import hashlib
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import polling
+from aggcon_v2 import SourceLease, load_source_state
+
+# ---- paramètres ----
+LEASE = timedelta(minutes=30)    # plus long que le traitement d'une source ; au-delà elle est reprise
+
+
+def worker_id() -> str:
+    """Identifiant unique du worker (machine, process, run)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def parse_shard(value: str | None) -> tuple[int, int] | None:
+    """'i/N' -> (i, N) avec 0 <= i < N ; None ou '' -> None (toutes les sources)."""
+    if not value:
+        return None
+    try:
+        i, n = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise ValueError(f"shard attendu sous la forme i/N : {value!r}") from None
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"shard invalide : {value!r} (0 <= i < N)")
+    return i, n
+
+
+def shard_of(url: str, n: int) -> int:
+    # sha1 et pas hash() : même résultat d'un process (ou d'une machine) à l'autre
+    return int.from_bytes(hashlib.sha1(url.encode("utf-8")).digest()[:8], "big") % n
+
+
+def filter_shard(sources, shard: tuple[int, int] | None):
+    """Sources de la part `shard` = (i, N) ; toutes si shard est None."""
+    if shard is None:
+        return sources
+    i, n = shard
+    return [src for src in sources if shard_of(src["url"], n) == i]
+
+
+def claim(session, url: str, owner: str, run_started: datetime, force: bool = False) -> dict | None:
+    """
+    Prend le bail de la source. Renvoie son état relu en base ({} si elle n'a jamais été interrogée),
+    ou None si un autre worker la détient ou l'a déjà interrogée pendant ce run.
+    """
+    now = datetime.utcnow()
+    session.execute(sqlite_insert(SourceLease).values(url=url).on_conflict_do_nothing(index_elements=["url"]))
+    # UPDATE conditionnel : si un autre worker a pris le bail entre-temps, 0 ligne modifiée
+    n = (
+        session.query(SourceLease)
+        .filter(SourceLease.url == url, or_(SourceLease.leased_until.is_(None), SourceLease.leased_until < now))
+        .update({"owner": owner, "leased_until": now + LEASE}, synchronize_session=False)
+    )
+    session.commit()
+    if not n:
+        return None
+
+    fresh = load_source_state(session, url) or {}
+    last = fresh.get("last_fetched_at")
+    if (isinstance(last, datetime) and last >= run_started) or (not force and not polling.is_due(fresh, now)):
+        release(session, url, owner)
+        return None
+    return fresh
+
+
+def release(session, url: str, owner: str):
+    session.query(SourceLease).filter(SourceLease.url == url, SourceLease.owner == owner).update(
+        {"owner": None, "leased_until": None}, synchronize_session=False
+    )
+    session.commit()
+
+
+def release_all(session, owner: str):
+    """Rend les baux encore détenus (run interrompu, budget épuisé...)."""
+    session.rollback()
+    session.query(SourceLease).filter(SourceLease.owner == owner).update(
+        {"owner": None, "leased_until": None}, synchronize_session=False
+    )
+    session.commit()
@@ -2,6 +2,8 @@ from pathlib import Path
 from datetime import datetime
 import base64
 
+import thumbnails
+
 # =========================
 # CSS (scopé aux composants)
 # =========================
@@ -116,6 +118,7 @@ html.dark-mode .meta{ color:var(--meta-dark); }
 /* Académique : vignette à droite, hauteur flexible */
 .card img.thumb-right{
   width:120px;
+  height:auto;       /* hauteur proportionnelle malgré les attributs width/height (voir _img_box) */
   max-height:180px;
   object-fit:cover;
   border-radius:12px;
@@ -162,18 +165,46 @@ a.btn{
 # =========================
 # Utils HTML / formatage
 # =========================
-def _src(path_or_url: str | None) -> str | None:
+_MIME = {".png": "image/png", ".webp": "image/webp", ".gif": "image/gif", ".svg": "image/svg+xml"}
+
+def _src(path_or_url: str | None, variant: str | None = None) -> str | None:
+    """
+    Source d'une balise <img>. Avec `variant` (voir thumbnails.VARIANTS), une image distante est
+    remplacée par sa vignette WebP servie en fichier statique si elle est prête ; sinon on garde
+    l'URL d'origine (la vignette est préparée en arrière-plan par thumbnails.prefetch).
+    """
     if not path_or_url:
         return None
+    if variant:
+        served = thumbnails.public_url(path_or_url, variant)
+        if served is not None:
+            return served
     if str(path_or_url).startswith(("http://", "https://", "data:")):
         return path_or_url
     p = Path(path_or_url)
     if p.exists():
         b64 = base64.b64encode(p.read_bytes()).decode("utf-8")
-        mime = "image/png" if p.suffix.lower() in [".png", ".webp"] else "image/jpeg"
+        mime = _MIME.get(p.suffix.lower(), "image/jpeg")
         return f"data:{mime};base64,{b64}"
     return None
 
+def _img_box(item: dict, sized: bool = True) -> str:
+    """
+    Attributs <img> de image_url mesurée à l'ingestion (voir thumbnails.placeholder) :
+    width / height réservent la place (pas de saut de mise en page), la couleur dominante
+    et l'aperçu flou s'affichent en fond tant que l'image n'est pas arrivée.
+    sized=False : cadre de hauteur fixe (vidéo), seulement le fond.
+    """
+    attrs = ""
+    if sized and item.get("image_width") and item.get("image_height"):
+        attrs = f' width="{item["image_width"]}" height="{item["image_height"]}"'
+    style = []
+    if item.get("image_color"):
+        style.append(f"background-color:{item['image_color']}")
+    if item.get("image_placeholder"):
+        style.append(f"background-image:url('{item['image_placeholder']}');background-size:cover;background-position:center")
+    return attrs + (f' style="{";".join(style)}"' if style else "")
+
 def _fmt_date_fr(date_str: str | None) -> str | None:
     if not date_str:
         return None
@@ -216,11 +247,12 @@ def card_tweet_item(st, item: dict):
     - texte
     - actions (si counts fourni)
     """
-    avatar_src = _src(item.get("profile_image_url")) 
+    avatar_src = _src(item.get("profile_image_url"), "avatar") 
     title = item.get("title") or "Post"
     text  = item.get("description") or ""
     url   = item.get("url") or "#"
-    img     = _src(item.get("image_url")) 
+    img     = _src(item.get("image_url"), "hero") 
+    box     = _img_box(item) if img else ""
 
     # Handle/author/date si disponibles
     handle = item.get("handle") or item.get("author") or item.get("source")
@@ -240,7 +272,7 @@ def card_tweet_item(st, item: dict):
       </div>
     </div>
     <div>{_truncate(text, 280)}</div>
-    <img class="hero-below" src="{img}" alt="">
+    <img class="hero-below" src="{img}"{box} alt="">
     """
     html += actions_html + "<!-- vide -->"
 
@@ -262,7 +294,9 @@ def card_academic_item(st, item: dict):
     - h4 titre compact + ligne auteurs/meta
     - chapeau texte
     """
-    cover_src = _src(item.get("image_url")) or "https://picsum.photos/200/300"
+    cover_src = _src(item.get("image_url"), "thumb")
+    box       = _img_box(item) if cover_src else ""
+    cover_src = cover_src or "https://picsum.photos/200/300"
     titre     = item.get("title") or "Publication"
     chapeau   = _truncate(item.get("description"), 300)
     auteurs   = item.get("authors") or item.get("by") or ""
@@ -271,7 +305,7 @@ def card_academic_item(st, item: dict):
 
     # On suit exactement la structure que tu as montrée
     html = f"""
-    <img class="thumb-right" src="{cover_src}" alt="Couverture">
+    <img class="thumb-right" src="{cover_src}"{box} alt="Couverture">
     <h4>{titre}</h4>
     <p class="meta">{auteurs or meta_line}</p>
     <div class="acad-bottom">
@@ -292,7 +326,9 @@ def card_press_item(st, item: dict):
     - Image large en bas (hero-below)
     - Meta
     """
-    img     = _src(item.get("image_url")) or "https://picsum.photos/1400/360"
+    img     = _src(item.get("image_url"), "hero")
+    box     = _img_box(item) if img else ""
+    img     = img or "https://picsum.photos/1400/360"
     titre   = item.get("title") or ""
     extrait = _truncate(item.get("description"), 280)
     url     = item.get("url") or "#"
@@ -301,7 +337,7 @@ def card_press_item(st, item: dict):
     html = f"""
     <h4>{titre}</h4>
     <p>{extrait}</p>
-    <img class="hero-below" src="{img}" alt="">
+    <img class="hero-below" src="{img}"{box} alt="">
     <p class="meta">{meta}</p>
     """
     if url and url != "#":
@@ -316,7 +352,9 @@ def card_video_item(st, item: dict):
     - Titre
     - Extrait
     """
-    img     = _src(item.get("image_url")) or "https://picsum.photos/1400/360"
+    img     = _src(item.get("image_url"), "hero")
+    box     = _img_box(item, sized=False) if img else ""
+    img     = img or "https://picsum.photos/1400/360"
     titre   = item.get("title") or ""
     extrait = _truncate(item.get("description"), 150)
     url     = item.get("url") or "#"
@@ -324,7 +362,7 @@ def card_video_item(st, item: dict):
 
     html = f"""
     <div id="crop-image_video"> 
-    <img class="image-video" src="{img}" alt="">
+    <img class="image-video" src="{img}"{box} alt="">
     </div>
     <p class="meta">{meta}</p>
     <h4 class="titre-video">{titre}</h4>
@@ -342,7 +380,7 @@ def card_report_item(st, item: dict):
     - h3 titre
     - plusieurs lignes meta (si besoin) + date
     """
-    logo = _src(item.get("institution_logo_url"))
+    logo = _src(item.get("institution_logo_url"), "logo")
     titre = item.get("title") or "Rapport"
     url   = item.get("url") or "#"
 
@@ -377,14 +415,14 @@ def card_fallback_item(st, item: dict):
     desc  = _truncate(item.get("description"), 260)
     url   = item.get("url") or "#"
     meta  = _meta_line(item.get("source"), item.get("published_at"), item.get("platform"))
-    img   = _src(item.get("image_url"))
+    img   = _src(item.get("image_url"), "hero")
 
     html = f"""
     <h4>{titre}</h4>
     <p>{desc}</p>
     """
     if img:
-        html += f'<img class="hero-below" src="{img}" alt="">'
+        html += f'<img class="hero-below" src="{img}"{_img_box(item)} alt="">'
     html += f'<p class="meta">{meta}</p>'
     if url and url != "#":
         html += f'<a href="{url}" style="color:#1266cc;text-decoration:none">Ouvrir →</a>'
@@ -0,0 +1,281 @@
+# thumbnails.py
+"""
+Vignettes locales des images affichées dans les cartes (voir style.py).
+Elles sont servies comme fichiers statiques par Streamlit (static/thumbs, server.enableStaticServing
+dans .streamlit/config.toml), pas intégrées au HTML. L'affichage ne les attend jamais : prefetch()
+les prépare en arrière-plan et la carte garde l'URL d'origine (avec son aperçu flou) tant qu'elles manquent.
+Chaque image (image_url, profile_image_url, institution_logo_url) est téléchargée une seule fois,
+redimensionnée avec Pillow à la taille de son emplacement dans les cartes, encodée en WebP et rangée
+dans un stockage adressé par contenu : <dossier>/<format>/<sha256(url)[:2]>/<sha256(url)>.webp
+Formats (mêmes tailles que le CSS de style.py) :
+- hero   : image pleine largeur (hero-below, image-video) : 800 px, largeur max de la colonne
+- thumb  : vignette académique (thumb-right) : 120 px de large, 180 px de haut au plus
+- avatar : photo de profil : carré de 40 px
+- logo   : logo d'institution : 120 px de large
+Une URL qui n'a pas donné d'image (SVG, page HTML, image illisible...) n'est pas retentée avant FAILURE_TTL :
+la carte garde alors le lien d'origine.
+placeholder(url) : dimensions, couleur dominante et aperçu flou de l'image, calculés à l'ingestion
+(tâche "placeholder" de enrichment_queue.py) et stockés sur le contenu : la carte réserve la place
+de l'image et l'affiche floutée avant qu'elle n'arrive.
+L'aperçu et l'empreinte de image_index.py sont calculés sur la vignette "hero" stockée :
+l'image d'en-tête n'est téléchargée qu'une fois à l'ingestion (ses dimensions d'origine sont gardées à côté).
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from PIL import Image, ImageFilter, ImageOps, UnidentifiedImageError
+
+import http_client
+
+# ---- paramètres ----
+STATIC_DIR = Path(__file__).parent / "static"      # dossier servi par Streamlit sous STATIC_URL
+STATIC_URL = "app/static"
+STORE_DIR = Path(os.getenv("THUMB_STORE_PATH", str(STATIC_DIR / "thumbs")))
+VARIANTS = {              # largeur, hauteur max (None = proportionnelle)
+    "hero": (800, None),
+    "thumb": (120, 180),
+    "avatar": (40, 40),
+    "logo": (120, None),
+}
+WEBP_QUALITY = 80
+MAX_IMAGE_BYTES = 15_000_000
+FAILURE_TTL = 24 * 3600
+THUMB_WORKERS = 8
+PLACEHOLDER_WIDTH = 16     # aperçu flou : 16 px de large, quelques centaines d'octets en WebP
+PLACEHOLDER_QUALITY = 40
+
+# un verrou par "tranche" d'URL : deux threads ne téléchargent pas la même image
+_LOCKS = [threading.Lock() for _ in range(64)]
+# préparation en arrière-plan pour l'affichage : URLs en cours, pour ne pas les soumettre à chaque rerun
+_BACKGROUND: ThreadPoolExecutor | None = None
+_IN_FLIGHT: set[str] = set()
+_IN_FLIGHT_LOCK = threading.Lock()
+
+
+def _key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def thumbnail_path(url: str, variant: str) -> Path:
+    key = _key(url)
+    return STORE_DIR / variant / key[:2] / f"{key}.webp"
+
+
+def _size_path(url: str) -> Path:
+    key = _key(url)
+    return STORE_DIR / "size" / key[:2] / f"{key}.json"
+
+
+def _failure_path(url: str) -> Path:
+    key = _key(url)
+    return STORE_DIR / "failed" / key[:2] / key
+
+
+def _failed_recently(url: str) -> bool:
+    p = _failure_path(url)
+    return p.exists() and time.time() - p.stat().st_mtime < FAILURE_TTL
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _download(url: str) -> bytes | None:
+    """
+    Octets de l'image, None si la réponse n'en est pas une ou dépasse MAX_IMAGE_BYTES
+    (lecture en streaming arrêtée au plafond) ; une erreur réseau est levée.
+    """
+    # l'original n'est pas gardé, seulement ses vignettes
+    resp = http_client.get(url, cache=False, max_bytes=MAX_IMAGE_BYTES + 1, read_media=True)
+    if resp.status_code != 200 or not resp.content or resp.partial:
+        return None
+    return resp.content
+
+
+def _render(img: Image.Image, variant: str) -> Image.Image:
+    width, max_height = VARIANTS[variant]
+    img = ImageOps.exif_transpose(img)
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    img = img.convert("RGBA" if has_alpha else "RGB")
+    if variant == "avatar":
+        return ImageOps.fit(img, (width, max_height), Image.LANCZOS)
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+    if max_height and img.height > max_height:
+        # object-fit: cover → on garde le centre
+        top = (img.height - max_height) // 2
+        img = img.crop((0, top, img.width, top + max_height))
+    return img
+
+
+def ensure(url: str, variants, raise_errors: bool = False) -> dict:
+    """
+    Vignettes `variants` de l'image `url` ({format: Path ou None}), créées si besoin
+    à partir d'un seul téléchargement.
+    Erreur réseau : vignettes None sans mémoriser d'échec (on réessaiera) ; levée si raise_errors.
+    """
+    out = {v: thumbnail_path(url, v) for v in variants}
+    missing = [v for v, p in out.items() if not p.exists()]
+    if not missing:
+        return out
+    with _LOCKS[int(_key(url)[:8], 16) % len(_LOCKS)]:
+        missing = [v for v in missing if not out[v].exists()]
+        if not missing:
+            return out
+        if _failed_recently(url):
+            return {v: (None if v in missing else p) for v, p in out.items()}
+        try:
+            data = _download(url)
+        except requests.RequestException as e:
+            if raise_errors:
+                raise
+            print(f"[thumbs] {url} : {e}")
+            return {v: (None if v in missing else p) for v, p in out.items()}
+        try:
+            if data is None:
+                raise ValueError("pas d'image")
+            with Image.open(io.BytesIO(data)) as img:
+                width, height = img.size
+                if img.getexif().get(0x0112) in (5, 6, 7, 8):      # photo tournée de 90° (EXIF Orientation)
+                    width, height = height, width
+                _write_atomic(_size_path(url), json.dumps([width, height]).encode("ascii"))
+                # JPEG : décodage directement à taille réduite (bien plus rapide pour les grandes photos)
+                largest = max(VARIANTS[v][0] for v in missing)
+                img.draft("RGB", (largest * 2, largest * 2))
+                img.load()
+                for v in missing:
+                    buf = io.BytesIO()
+                    _render(img, v).save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+                    _write_atomic(out[v], buf.getvalue())
+        except (ValueError, OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            _write_atomic(_failure_path(url), b"")
+            return {v: (None if v in missing else p) for v, p in out.items()}
+    return out
+
+
+def thumbnail(url: str | None, variant: str) -> Path | None:
+    """Vignette locale de `url` au format `variant`, None si l'image n'a pas pu être traitée."""
+    if not url or not str(url).startswith(("http://", "https://")):
+        return None
+    return ensure(url, [variant]).get(variant)
+
+
+def public_url(url: str | None, variant: str) -> str | None:
+    """
+    URL servie de la vignette de `url` si elle est déjà prête (rien n'est téléchargé ici),
+    None sinon ou si le stockage n'est pas sous STATIC_DIR (THUMB_STORE_PATH ailleurs).
+    """
+    if not url or not str(url).startswith(("http://", "https://")):
+        return None
+    path = thumbnail_path(url, variant)
+    if not path.exists():
+        return None
+    try:
+        return f"{STATIC_URL}/{path.relative_to(STATIC_DIR).as_posix()}"
+    except ValueError:
+        return None
+
+
+def item_images(item) -> dict:
+    """{url: {formats}} des images d'un contenu, selon la carte qui l'affiche."""
+    item = item if isinstance(item, dict) else item.__dict__
+    wanted = {}
+    hero = "thumb" if (item.get("type") or "").lower() == "académique" else "hero"
+    for field, variant in (("image_url", hero), ("profile_image_url", "avatar"), ("institution_logo_url", "logo")):
+        url = item.get(field)
+        if isinstance(url, str) and url.startswith(("http://", "https://")):
+            wanted.setdefault(url, set()).add(variant)
+    return wanted
+
+
+def _done(url: str):
+    with _IN_FLIGHT_LOCK:
+        _IN_FLIGHT.discard(url)
+
+
+def _ensure_in_background(url: str, variants):
+    try:
+        ensure(url, variants)
+    finally:
+        _done(url)
+
+
+def prefetch(items, max_workers: int = THUMB_WORKERS):
+    """
+    Lance en arrière-plan les vignettes manquantes de `items` (un téléchargement par image) et rend
+    la main tout de suite : elles seront servies aux affichages suivants.
+    """
+    global _BACKGROUND
+    wanted = {}
+    for item in items:
+        for url, variants in item_images(item).items():
+            wanted.setdefault(url, set()).update(variants)
+    todo = [(url, variants) for url, variants in wanted.items()
+            if not all(thumbnail_path(url, v).exists() for v in variants)]
+    if not todo:
+        return
+    with _IN_FLIGHT_LOCK:
+        todo = [(url, variants) for url, variants in todo if url not in _IN_FLIGHT]
+        _IN_FLIGHT.update(url for url, _ in todo)
+        if _BACKGROUND is None:
+            _BACKGROUND = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbs")
+    for url, variants in todo:
+        _BACKGROUND.submit(_ensure_in_background, url, variants)
+
+
+def _dominant_color(img: Image.Image) -> str:
+    q = img.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+    _, idx = max(q.getcolors())
+    r, g, b = q.getpalette()[idx * 3: idx * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def original_size(url: str, hero: Path) -> tuple[int, int]:
+    """Dimensions de l'image d'origine ; à défaut (vignette plus ancienne), celles de la vignette hero."""
+    try:
+        width, height = json.loads(_size_path(url).read_bytes())
+        return width, height
+    except (OSError, ValueError):
+        with Image.open(hero) as img:
+            return img.size
+
+
+def placeholder(url: str) -> dict:
+    """
+    Champs image_width / image_height / image_color / image_placeholder (data URI WebP flou) de l'image `url`,
+    calculés sur sa vignette hero (même téléchargement que l'empreinte de image_index.py).
+    {} si ce n'est pas une image lisible ; une erreur réseau est levée (la tâche sera retentée).
+    """
+    hero = ensure(url, ["hero"], raise_errors=True)["hero"]
+    if hero is None:
+        return {}
+    try:
+        width, height = original_size(url, hero)
+        with Image.open(hero) as img:
+            small = img.convert("RGBA")
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return {}
+    small.thumbnail((64, 64), Image.LANCZOS)
+    # les zones transparentes (logos...) sont vues sur fond blanc, comme dans la carte
+    flat = Image.new("RGB", small.size, (255, 255, 255))
+    flat.paste(small, mask=small.getchannel("A"))
+    tiny = flat.resize((PLACEHOLDER_WIDTH, max(1, round(PLACEHOLDER_WIDTH * height / width))), Image.LANCZOS)
+    buf = io.BytesIO()
+    tiny.filter(ImageFilter.GaussianBlur(1)).save(buf, "WEBP", quality=PLACEHOLDER_QUALITY)
+    return {
+        "image_width": width,
+        "image_height": height,
+        "image_color": _dominant_color(flat),
+        "image_placeholder": "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii"),
+    }
@@ -1,73 +1,344 @@
 # worker.py
-import json, time
+import argparse
+import asyncio
+import copy
+import json, os, time
+from collections import defaultdict
+from datetime import datetime
+from itertools import zip_longest
 from pathlib import Path
 from tqdm import tqdm
 
+import enrichment_queue
+import http_client
+import polling
+import source_leases
 # 👇 importe SessionLocal et Content depuis aggcon_v2
-from aggcon_v2 import SessionLocal, Content, adapter_rss, scan_pertinence, save_to_db,  Base, engine, ensure_schema
+from aggcon_v2 import SessionLocal, Content, adapter_rss, scan_pertinence, save_items,  Base, engine, ensure_schema, load_feed_state, save_feed_state, load_known_urls, SOURCES_PRIORITAIRES
 Base.metadata.create_all(bind=engine)
 ensure_schema()
 
 data_file = Path(__file__).parent / "sources_actuelles.json"
 
-def run_worker():
+ASYNC_MODE = True        # False pour revenir à la boucle séquentielle
+MAX_CONCURRENCY = 8      # sources traitées en même temps (mode async)
+MAX_PER_HOST = 2         # requêtes simultanées max vers un même hôte (flux + pages)
+ENTRY_WORKERS = 4        # pages d'entrées téléchargées en parallèle pour une source (mode direct)
+# True : contenus insérés depuis le flux seul, pages / avatars / logos traités ensuite via la file
+# (enrichment_queue.py) ; False : enrichissement direct dans adapter_rss
+QUEUE_MODE = True
+ENRICH_WORKERS = enrichment_queue.ENRICH_WORKERS
+# True : toutes les sources sont interrogées, même celles qui ne sont pas dues (voir polling.py)
+FORCE_FULL_SWEEP = os.getenv("FORCE_FULL_SWEEP", "0") == "1"
+# "i/N" : ce worker ne traite que la part i des sources (voir source_leases.py) ; --shard en ligne de commande
+WORKER_SHARD = os.getenv("WORKER_SHARD", "")
+
+RUN_BUDGET = float(os.getenv("RUN_BUDGET_S", "1500"))   # durée max du run en secondes (0 = illimitée)
+ENTRY_DEADLINE = 30.0    # secondes d'enrichissement max par entrée
+# part du budget restante en dessous de laquelle on renonce à un enrichissement :
+# les logos et aperçus d'images d'abord, puis les avatars, puis les pages ; des sources entières seulement une fois tout épuisé
+DEGRADE_AT = {"logo": 0.5, "placeholder": 0.5, "profile_image": 0.25, "page": 0.10}
+
+
+def _load_sources():
+    #---------------------------------Importe les sources qui sont une liste de dictionnaire, avec notamment les liens RSS-----------------------
+    with open(data_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _interleave_by_host(plan):
+    """
+    Ordre de passage équitable entre hôtes : une source par hôte à tour de rôle
+    (évite que les créneaux de concurrence attendent tous le même hôte).
+    L'ordre de priorité est conservé au sein de chaque hôte.
+    """
+    by_host = defaultdict(list)
+    for src, max_posts in plan:
+        by_host[http_client.host_of(src["url"])].append((src, max_posts))
+    return [pair for group in zip_longest(*by_host.values()) for pair in group if pair is not None]
+
+
+def _plan_sources(session, sources, state, force: bool):
+    """Sources dues ce run avec leur max_posts, par ordre de priorité, + rythmes de publication estimés."""
+    rates = polling.get_publication_rates(session, Content)
+    plan = polling.plan_run(sources, state, rates, force=force)
+    plan = polling.order_by_priority(plan, state, SOURCES_PRIORITAIRES)
+    print(f"🗓️ {len(plan)}/{len(sources)} sources dues" + (" (balayage complet)" if force else ""))
+    return plan, rates
+
+
+def _budget_deadlines(budget: float) -> dict:
+    """Échéances (time.monotonic()) de chaque enrichissement et des sources ; {} sans budget."""
+    if not budget or budget <= 0:
+        return {}
+    start = time.monotonic()
+    deadlines = {task: start + budget * (1 - share) for task, share in DEGRADE_AT.items()}
+    deadlines["sources"] = start + budget
+    return deadlines
+
+
+def _skipped_enrichment(deadlines) -> frozenset:
+    now = time.monotonic()
+    return frozenset(task for task, limit in deadlines.items() if task != "sources" and now >= limit)
+
+
+def _out_of_budget(deadlines) -> bool:
+    return "sources" in deadlines and time.monotonic() >= deadlines["sources"]
+
+
+def _fetch_source(src, state, known_urls, entry_workers: int = 1, max_posts: int = polling.MIN_POSTS,
+                  skip_enrichment: frozenset = frozenset()):
+    return adapter_rss(
+        source_url=src["url"],
+        source_name=src["name"],
+        source_platform=src["platform"],
+        default_type="ARTICLE",
+        category=src["category"],
+        max_posts=max_posts,
+        entry_workers=entry_workers,
+        state=state,
+        known_urls=known_urls,
+        enrich=not QUEUE_MODE,
+        skip_enrichment=skip_enrichment,
+        entry_deadline=ENTRY_DEADLINE,
+        )
+
+
+def _save_items(session, items):
+    # une transaction par source
+    if not QUEUE_MODE:
+        save_items(session, [item for item in items if scan_pertinence(item)])
+        return
+    # la description peut encore venir de la page : le filtre est refait après la tâche "page"
+    items = [item for item in items if scan_pertinence(item) or "page" in item["pending_tasks"]]
+    save_items(session, items)
+    enrichment_queue.enqueue_items(session, items)
+
+
+def _claim_source(session, src, state, owner, run_started, force) -> bool:
+    """Prend le bail de la source ; False si un autre worker la traite ou vient de la traiter."""
+    fresh = source_leases.claim(session, src["url"], owner, run_started, force=force)
+    if fresh is None:
+        return False
+    state[src["url"]] = fresh     # état le plus récent (validateurs, curseur) : un autre run a pu le modifier
+    return True
+
+
+def _fail_source(session, state, src, owner, snapshot, error):
+    """
+    Passage interrompu par une exception : l'état d'avant le passage est remis (validateurs, curseur),
+    sinon le prochain run aurait un 304 ou sauterait le curseur et perdrait ces entrées.
+    Rien n'est enregistré ni planifié : la source reste due.
+    """
+    print(f"[worker] {src['name']} : {error}")
+    if snapshot is None:
+        state.pop(src["url"], None)
+    else:
+        state[src["url"]] = snapshot
+    source_leases.release(session, src["url"], owner)
+
+
+def _finish_source(session, state, src, owner):
+    """Enregistre tout de suite l'état de la source (les autres workers le relisent), puis rend le bail."""
+    if src["url"] in state:
+        save_feed_state(session, {src["url"]: state[src["url"]]})
+    source_leases.release(session, src["url"], owner)
+
+
+def _drain_queue(session, deadlines):
+    if not QUEUE_MODE:
+        return
+    print(f"🧩 Enrichissement : {enrichment_queue.pending_count(session)} tâches en file")
+    stats = enrichment_queue.drain(
+        session, max_workers=ENRICH_WORKERS,
+        task_deadlines={task: limit for task, limit in deadlines.items() if task != "sources"},
+        entry_deadline=ENTRY_DEADLINE,
+    )
+    print(f"🧩 Enrichissement : {stats['done']} faites, {stats['retry']} à réessayer, {stats['failed']} abandonnées"
+          + (f", {stats['deferred']} reportées (quota Google CSE)" if stats["deferred"] else ""))
+
+
+def _print_slowest(timings):
+    #---------------------------MESURE DU TEMPS -----------------
+    print("\n🐢 Top 5 :")
+    for name, dt in sorted(timings, key=lambda x: x[1], reverse=True)[:5]:
+        print(f"- {name}: {dt:.2f}s")
+    #--------------------------------------------------
+
+
+def _print_taken(taken):
+    if taken:
+        print(f"🔒 {len(taken)} sources déjà traitées par un autre worker")
+
+
+def _print_budget(skipped, deadlines):
+    if skipped:
+        names = ", ".join(s["name"] for s in skipped[:5]) + ("..." if len(skipped) > 5 else "")
+        print(f"⏱️ Budget du run épuisé : {len(skipped)} sources reportées ({names})")
+    elif _skipped_enrichment(deadlines):
+        print(f"⏱️ Budget serré : enrichissements abandonnés : {', '.join(sorted(_skipped_enrichment(deadlines)))}")
+
+
+def run_worker(force: bool = FORCE_FULL_SWEEP, budget: float = RUN_BUDGET, shard: tuple[int, int] | None = None):
     """
     Boucle principale du worker :
-    - lit les sources configurées
-    - appelle l’adapter
+    - lit les sources configurées (seulement la part `shard` = (i, N) si donnée)
+    - garde celles qui sont dues (sauf force=True), par ordre de priorité
+    - prend le bail de chaque source (aucune source traitée par deux workers à la fois)
+    - appelle l’adapter (dans la limite du budget de `budget` secondes)
     - filtre les items
     - sauvegarde en base
+    - vide la file d’enrichissement (QUEUE_MODE)
     """
     session = SessionLocal()
-    #---------------------------------Importe les sources qui sont une liste de dictionnaire, avec notamment les liens RSS-----------------------
-    with open(data_file, encoding="utf-8") as f:
-        sources = json.load(f)
-    #----------------------------------------------------------------------------------------
+    owner, run_started = source_leases.worker_id(), datetime.utcnow()
+    sources = source_leases.filter_shard(_load_sources(), shard)
+    # validateurs HTTP des flux (GET conditionnel : un flux inchangé coûte un 304)
+    state = load_feed_state(session)
+    # URLs déjà stockées : leurs entrées ne sont pas ré-enrichies
+    known_urls = load_known_urls(session)
+    plan, rates = _plan_sources(session, sources, state, force)
+    deadlines = _budget_deadlines(budget)
+    skipped, taken = [], []
 
 
 
     #---------------------------MESURE DU TEMPS -----------------
-    #rappel tqdm c'est pour mesurer le temps de l'itération, avec desc la description de la barre de progression, il sert d'itérateur 
-    bar = tqdm(sources, desc="Avancée générale")
+    #rappel tqdm c'est pour mesurer le temps de l'itération, avec desc la description de la barre de progression, il sert d'itérateur
+    bar = tqdm(plan, desc="Avancée générale")
     timings = []
     #---------------------------MESURE DU TEMPS -----------------
 
-    for src in bar:
+    try:
+        for src, max_posts in bar:
 
-        #---------------------------MESURE DU TEMPS -----------------
-        bar.set_description(f"Avancée générale (on en est à {src['name']})")
-        start = time.perf_counter()
-        #---------------------------MESURE DU TEMPS -----------------
+            #---------------------------MESURE DU TEMPS -----------------
+            bar.set_description(f"Avancée générale (on en est à {src['name']})")
+            start = time.perf_counter()
+            #---------------------------MESURE DU TEMPS -----------------
 
 
-        items = adapter_rss(
-            source_url=src["url"],
-            source_name=src["name"],
-            source_platform=src["platform"],
-            default_type="ARTICLE",
-            category=src["category"],
-            max_posts=2
-            )
+            if _out_of_budget(deadlines):
+                # budget épuisé : la source reste due pour le prochain run
+                skipped.append(src)
+                continue
+            if not _claim_source(session, src, state, owner, run_started, force):
+                taken.append(src)
+                continue
+            snapshot = copy.deepcopy(state.get(src["url"]))
+            try:
+                items = _fetch_source(src, state, known_urls, max_posts=max_posts,
+                                      skip_enrichment=_skipped_enrichment(deadlines))
+            except Exception as e:
+                _fail_source(session, state, src, owner, snapshot, e)
+                continue
+            _save_items(session, items)
+            rates[src["name"]] = polling.get_source_rate(session, Content, src["name"])
+            polling.schedule_next(state, src, rates)
+            _finish_source(session, state, src, owner)
 
-        
-        for item in items:
-            if scan_pertinence(item):
-                save_to_db(session, item)
-        
-        end = time.perf_counter()
+            end = time.perf_counter()
 
-        #timings est une liste de couple ("Thinkerview", 20s)
-        timings.append((src["name"], end - start))
-        #--------------------------------------------------
+            #timings est une liste de couple ("Thinkerview", 20s)
+            timings.append((src["name"], end - start))
+            #--------------------------------------------------
+    finally:
+        source_leases.release_all(session, owner)
 
-    #---------------------------MESURE DU TEMPS -----------------
-    print("\n🐢 Top 5 :")
-    for name, dt in sorted(timings, key=lambda x: x[1], reverse=True)[:5]:
-        print(f"- {name}: {dt:.2f}s")
-    #--------------------------------------------------
+    _print_slowest(timings)
+    _drain_queue(session, deadlines)
+    _print_taken(taken)
+    _print_budget(skipped, deadlines)
+
+    print("✅ Worker terminé : contenus agrégés et stockés.")
 
 
+async def run_worker_async(max_concurrency: int = MAX_CONCURRENCY,
+                           max_per_host: int = MAX_PER_HOST,
+                           entry_workers: int = ENTRY_WORKERS,
+                           force: bool = FORCE_FULL_SWEEP,
+                           budget: float = RUN_BUDGET,
+                           shard: tuple[int, int] | None = None):
+    """
+    Même travail que run_worker, mais les sources sont téléchargées en parallèle :
+    - au plus `max_concurrency` sources en cours
+    - au plus `max_per_host` requêtes simultanées vers un même hôte (et débit limité par hôte)
+    - seulement les sources dues (sauf force=True), par priorité et alternées par hôte
+    - budget de `budget` secondes : on renonce aux logos, avatars puis pages avant de reporter des sources
+    - baux par source et `shard` : comme run_worker
+    - les écritures en base restent faites ici, une source après l'autre
+    """
+    session = SessionLocal()
+    owner, run_started = source_leases.worker_id(), datetime.utcnow()
+    sources = source_leases.filter_shard(_load_sources(), shard)
+    state = load_feed_state(session)
+    known_urls = load_known_urls(session)
+    plan, rates = _plan_sources(session, sources, state, force)
+    plan = _interleave_by_host(plan)
+    deadlines = _budget_deadlines(budget)
+    skipped, taken = [], []
+    http_client.set_max_per_host(max_per_host)
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(src, max_posts):
+        async with sem:
+            # le chrono démarre quand la source obtient un créneau (pas pendant l'attente)
+            start = time.perf_counter()
+            if _out_of_budget(deadlines):
+                # budget épuisé : la source reste due pour le prochain run
+                skipped.append(src)
+                return src, None, 0.0
+            if not _claim_source(session, src, state, owner, run_started, force):
+                taken.append(src)
+                return src, None, 0.0
+            snapshot = copy.deepcopy(state.get(src["url"]))
+            try:
+                items = await asyncio.to_thread(_fetch_source, src, state, known_urls, entry_workers, max_posts,
+                                                _skipped_enrichment(deadlines))
+            except Exception as e:
+                _fail_source(session, state, src, owner, snapshot, e)
+                return src, None, 0.0
+            return src, items, time.perf_counter() - start
+
+    bar = tqdm(total=len(plan), desc="Avancée générale")
+    timings = []
+    try:
+        for fut in asyncio.as_completed([fetch(src, max_posts) for src, max_posts in plan]):
+            src, items, dt = await fut
+            bar.update(1)
+            if items is None:     # budget épuisé, source prise par un autre worker ou en échec
+                continue
+            bar.set_description(f"Avancée générale (terminé : {src['name']})")
+            _save_items(session, items)
+            rates[src["name"]] = polling.get_source_rate(session, Content, src["name"])
+            polling.schedule_next(state, src, rates)
+            _finish_source(session, state, src, owner)
+            timings.append((src["name"], dt))
+    finally:
+        source_leases.release_all(session, owner)
+    bar.close()
+
+    _print_slowest(timings)
+    _drain_queue(session, deadlines)
+    _print_taken(taken)
+    _print_budget(skipped, deadlines)
+
     print("✅ Worker terminé : contenus agrégés et stockés.")
 
+
 if __name__ == "__main__":
-    run_worker()
+    # plusieurs workers peuvent tourner en même temps sur le même fichier mydb.db (pas sur des copies :
+    # voir source_leases.py) : sans --shard, chacun prend la prochaine source due dont le bail est libre
+    cli = argparse.ArgumentParser(description="Ingestion des sources configurées")
+    cli.add_argument("--shard", default=WORKER_SHARD,
+                     help="i/N : ne traiter que la part i (0..N-1) des sources, ex : 0/4")
+    args = cli.parse_args()
+    try:
+        shard = source_leases.parse_shard(args.shard)
+    except ValueError as e:
+        cli.error(str(e))
+
+    if ASYNC_MODE:
+        asyncio.run(run_worker_async(shard=shard))
+    else:
+        run_worker(shard=shard)